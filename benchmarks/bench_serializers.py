@@ -0,0 +1,105 @@
+"""
+Микро-бенчмарк сериализации постов (без базы данных).
+
+Запуск из корня проекта:
+    python benchmarks/bench_serializers.py [--rows 1000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'new_blog.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+
+from blog_api.models import Note  # noqa: E402
+from blog_api.serializers import NoteSerializer, NoteValuesSerializer  # noqa: E402
+
+
+class LegacyNoteSerializer(serializers.ModelSerializer):
+    """ Прежняя реализация: ISO строка -> strptime -> strftime """
+    user = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    views = serializers.IntegerField(read_only=True)
+    is_read = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Note
+        fields = ('id', 'title', 'note', 'create_at', 'user', 'views', 'is_read')
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        create_at = datetime.strptime(ret['create_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
+        ret['create_at'] = create_at.strftime('%d %B %Y - %H:%M')
+        return ret
+
+
+def make_notes(rows):
+    user = User(id=1, username='bench')
+    start = datetime(2022, 8, 1, 12, 0, 0, 1, tzinfo=timezone.utc)
+    notes = []
+    for i in range(rows):
+        note = Note(
+            id=i + 1, user_id=1, title=f'Title {i}', note='text ' * 50,
+            create_at=start + timedelta(minutes=i), views=i,
+        )
+        note.user = user
+        note.is_read = bool(i % 2)
+        notes.append(note)
+    return notes
+
+
+def make_rows(notes):
+    """ Те же посты в виде строк .values(), как их отдаёт NoteValuesSerializer.get_values """
+    return [
+        {
+            'id': note.id, 'title': note.title, 'note': note.note, 'create_at': note.create_at,
+            'user__username': note.user.username, 'views': note.views, 'is_read': note.is_read,
+        }
+        for note in notes
+    ]
+
+
+def serialize_values(rows):
+    return NoteValuesSerializer().to_representation(rows)
+
+
+def bench(serialize, data, repeat):
+    best = min(timeit.repeat(lambda: serialize(data), number=1, repeat=repeat))
+    return best / len(data) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    notes = make_notes(args.rows)
+    rows = make_rows(notes)
+    expected = NoteSerializer(notes, many=True).data
+    assert LegacyNoteSerializer(notes, many=True).data == expected
+    assert serialize_values(rows) == expected
+
+    legacy = bench(lambda data: LegacyNoteSerializer(data, many=True).data, notes, args.repeat)
+    current = bench(lambda data: NoteSerializer(data, many=True).data, notes, args.repeat)
+    values = bench(serialize_values, rows, args.repeat)
+
+    print(f'NoteSerializer (strptime/strftime): {legacy:8.2f} us/row')
+    print(f'NoteSerializer (NoteDateTimeField): {current:8.2f} us/row')
+    print(f'NoteValuesSerializer (.values()):   {values:8.2f} us/row')
+    print(f'saving: {legacy - current:.2f} us/row ({(1 - current / legacy) * 100:.0f}%)')
+    print(f'saving (.values()): {current - values:.2f} us/row ({(1 - values / current) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ from . import models
 class ProfileInline(admin.StackedInline):
     """ Добавляем модель профиля в админку, чтобы они были на одной странице """
     model = models.Profile
+    readonly_fields = models.Profile.COUNTER_FIELDS
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -0,0 +1,160 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django_filters.filters import QuerySetRequestMixin
+from django_filters.utils import translate_validation
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import serializers, feed, reads, authentication
+from .filters import FeedFilter
+from .pagination import NotePagination
+from blog_api.models import Note
+
+
+class AsyncAPIView(APIView):
+    """
+    Представление только для чтения с async-обработчиком get: под ASGI Django вызывает его
+    в цикле событий без перехода в поток. Права, согласование формата и обработка ошибок -
+    методы APIView, асинхронно выполняются аутентификация и запросы к базе и кешу
+    """
+    permission_classes = [IsAuthenticated]
+    # порядок - как в DEFAULT_AUTHENTICATION_CLASSES, у каждого класса есть aauthenticate
+    authentication_classes = [authentication.AsyncSessionAuthentication, authentication.SignedTokenAuthentication]
+    # JSON рендерится без базы и шаблонов, поэтому прямо в цикле событий
+    renderer_classes = [JSONRenderer]
+
+    async def dispatch(self, request, *args, **kwargs):
+        """ APIView.dispatch, в котором аутентификация и обработчик ждут асинхронных запросов """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.authenticate(request)
+            # пользователь уже известен, поэтому initial только проверяет права и ограничения
+            self.initial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def authenticate(self, request):
+        """ Request._authenticate с асинхронными аутентификаторами """
+        for authenticator in request.authenticators:
+            try:
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # отложенный рендеринг Django выполнил бы в потоке, поэтому отдаём готовый HttpResponse
+        response = super().finalize_response(request, response, *args, **kwargs)
+        response.render()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+
+class AsyncNoteListView(AsyncAPIView):
+    """ Асинхронный список постов, как NoteAPIView """
+    queryset = Note.objects.order_by('-create_at', '-id')
+    pagination_class = NotePagination
+
+    async def get(self, request, *args, **kwargs):
+        return Response(await self.list(request))
+
+    async def get_queryset(self, request):
+        return self.queryset.all()
+
+    async def list(self, request):
+        queryset = await self.get_queryset(request)
+        serializer = serializers.NoteValuesSerializer(context={'request': request, 'view': self})
+
+        fields = serializer.fields
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        if 'is_read' in fields:
+            queryset = queryset.annotate(is_read=reads.is_read_by(request.user.profile.pk))
+
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(serializer.get_values(queryset), request, self)
+        return paginator.get_paginated_response(serializer.to_representation(page)).data
+
+
+class AsyncFeedView(AsyncNoteListView):
+    """ Асинхронная лента постов из подписок, как FeedAPIView (без кеша страниц и ETag) """
+    queryset = Note.objects.all()
+    filterset_class = FeedFilter
+    keyset_fields = feed.FEED_KEYSET_FIELDS
+
+    async def get_queryset(self, request):
+        queryset = await feed.afeed_queryset(request.user.profile)
+        return await self.filter_queryset(request, queryset)
+
+    async def filter_queryset(self, request, queryset):
+        """ Фильтры FeedFilter, как DjangoFilterBackend. Параметры проверяются один раз на все части ленты """
+        parts = queryset.querysets if isinstance(queryset, feed.MergedQuerySet) else [queryset]
+        filterset = self.filterset_class(request.query_params, queryset=parts[0], request=request)
+
+        if self.uses_database(filterset):
+            # ModelMultipleChoiceFilter (?read_posts=) проверяет id запросом, у форм нет асинхронного API
+            is_valid = await sync_to_async(filterset.is_valid)()
+        else:
+            is_valid = filterset.is_valid()
+        if not is_valid:
+            # тот же ответ, что и у DjangoFilterBackend
+            raise translate_validation(filterset.errors)
+
+        if isinstance(queryset, feed.MergedQuerySet):
+            return queryset.map(filterset.filter_queryset)
+        return filterset.filter_queryset(queryset)
+
+    @staticmethod
+    def uses_database(filterset):
+        return any(
+            isinstance(filter_, QuerySetRequestMixin) and name in filterset.data
+            for name, filter_ in filterset.filters.items()
+        )
+
+
+class AsyncNoteDetailView(AsyncAPIView):
+    """ Асинхронный просмотр поста, как NoteDetailAPIView: открытый пост отмечается прочитанным """
+    queryset = Note.objects.all()
+
+    async def get(self, request, *args, **kwargs):
+        return Response(await self.retrieve(request, kwargs['pk']))
+
+    async def retrieve(self, request, pk):
+        fields = serializers.NoteSerializer.get_requested_fields(request)
+        queryset = self.queryset
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+
+        try:
+            note = await queryset.aget(pk=pk)
+        except Note.DoesNotExist:
+            raise Http404
+        await reads.arecord_read(note, request.user.profile.pk)
+        note.is_read = True
+
+        return serializers.NoteSerializer(note, context={'request': request, 'view': self}).data
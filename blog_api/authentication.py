@@ -0,0 +1,143 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import connection
+from django.db.models import F
+from rest_framework import authentication, exceptions
+
+from blog_api import cache
+from blog_api.models import Profile
+
+TOKEN_SALT = 'blog_api.authentication'
+PRINCIPAL = 'principal'
+# поля пользователя, которые хранятся в кеше вместе с токеном
+PRINCIPAL_USER_FIELDS = ('id', 'username', 'is_staff', 'is_active')
+
+
+def make_token(user):
+    """ Подписанный токен: id пользователя и версия его токенов, срок действия - BLOG_TOKEN_MAX_AGE """
+    version = Profile.objects.values_list('token_version', flat=True).get(user=user)
+    return signing.dumps([user.pk, version], salt=TOKEN_SALT)
+
+
+def revoke_tokens(user_id):
+    """ Отзываем все токены пользователя увеличением версии """
+    Profile.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1)
+    invalidate_principal(user_id)
+
+
+def principal_queryset(user_id):
+    return Profile.objects \
+        .filter(user_id=user_id) \
+        .values_list('user_id', 'id', 'user__username', 'user__is_staff', 'user__is_active', 'token_version')
+
+
+def load_principal(user_id):
+    """ (user_id, profile_id, username, is_staff, is_active, token_version) из кеша или одним запросом """
+    key = cache.make_key(PRINCIPAL, user_id)
+    principal = cache.get_cache().get(key)
+    if principal is None:
+        principal = principal_queryset(user_id).first()
+        if principal is None:
+            return None
+        cache.get_cache().set(key, principal, settings.BLOG_TOKEN_CACHE_TIMEOUT)
+    return principal
+
+
+async def aload_principal(user_id):
+    """ load_principal для асинхронных представлений: асинхронные кеш и ORM """
+    key = cache.make_key(PRINCIPAL, user_id)
+    principal = await cache.get_cache().aget(key)
+    if principal is None:
+        principal = await principal_queryset(user_id).afirst()
+        if principal is None:
+            return None
+        await cache.get_cache().aset(key, principal, settings.BLOG_TOKEN_CACHE_TIMEOUT)
+    return principal
+
+
+def invalidate_principal(user_id):
+    cache.get_cache().delete(cache.make_key(PRINCIPAL, user_id))
+
+
+def build_user(principal):
+    """
+    Пользователь и профиль из закешированных полей без запросов к базе.
+    Остальные поля отложены и загрузятся при первом обращении
+    """
+    user_id, profile_id, username, is_staff, is_active, _ = principal
+    user = User.from_db(connection.alias, PRINCIPAL_USER_FIELDS, (user_id, username, is_staff, is_active))
+    user.profile = Profile.from_db(connection.alias, ('id', 'user_id'), (profile_id, user_id))
+    return user
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Заголовок Authorization: Bearer <token>. Подпись проверяется без базы,
+    пользователь и профиль берутся из кеша (BLOG_TOKEN_CACHE_TIMEOUT секунд).
+    Отозванные токены отсекаются по версии в профиле
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        user_id, version = token
+        return self.check_principal(load_principal(user_id), version)
+
+    async def aauthenticate(self, request):
+        """ authenticate для асинхронных представлений (blog_api.async_views) """
+        token = self.get_token(request)
+        if token is None:
+            return None
+        user_id, version = token
+        return self.check_principal(await aload_principal(user_id), version)
+
+    def get_token(self, request):
+        """ (user_id, версия токенов) из заголовка или None, если токена нет """
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            user_id, version = signing.loads(
+                auth[1].decode(), salt=TOKEN_SALT, max_age=settings.BLOG_TOKEN_MAX_AGE,
+            )
+        except (signing.BadSignature, UnicodeDecodeError, TypeError, ValueError):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return user_id, version
+
+    @staticmethod
+    def check_principal(principal, version):
+        if principal is None or not principal[4]:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        if principal[5] != version:
+            raise exceptions.AuthenticationFailed('Token has been revoked.')
+
+        return build_user(principal), None
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class AsyncSessionAuthentication(authentication.SessionAuthentication):
+    """
+    Сессия для асинхронных представлений. В Django 4.2 сессия и пользователь загружаются только
+    синхронно, поэтому переходим в поток, лишь когда у запроса есть cookie сессии
+    """
+
+    async def aauthenticate(self, request):
+        if request._request.session.session_key is None:
+            return None
+        return await sync_to_async(self.authenticate_with_profile)(request)
+
+    def authenticate_with_profile(self, request):
+        result = self.authenticate(request)
+        if result is not None:
+            # профиль нужен представлениям, а в цикле событий ленивая загрузка невозможна
+            result[0].profile
+        return result
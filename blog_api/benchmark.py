@@ -0,0 +1,293 @@
+import random
+import socket
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import uvicorn
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.pagination import PageNumberPagination
+
+from blog_api import authentication, cache, urls
+from blog_api.models import Profile, Note
+from blog_api.pagination import KeysetPagination
+
+LIST_PAGE_SIZES = (1, 10, 50)
+# пары синхронных (DRF) и асинхронных адресов для нагрузочного сравнения
+LOAD_TEST_PAIRS = (
+    ('feed/', 'async/feed/'),
+    ('notes/', 'async/notes/'),
+    ('notes/<int:pk>/', 'async/notes/<int:pk>/'),
+)
+# свой кеш в памяти процесса: замеры очищают его перед каждым запросом и не должны трогать общий Redis
+BENCHMARK_CACHES = {
+    'benchmark': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog-api-benchmark',
+    },
+}
+# обязательные параметры запроса, без которых адрес отвечает 400
+QUERY_STRINGS = {
+    'notes/search/': '?q=lorem',
+}
+
+
+def seed(users=50, follows=5, notes=500, reads=1000, seed=0):
+    """ Синтетические данные: пользователи, подписки, посты и прочтения """
+    rnd = random.Random(seed)
+    password = make_password('benchmark')
+
+    created = []
+    for i in range(users):
+        user = User(username=f'bench_{seed}_{i}', password=password)
+        user.save()
+        created.append(user)
+    # первый пользователь - администратор, чтобы замерять и служебные адреса
+    User.objects.filter(pk=created[0].pk).update(is_staff=True)
+    profile_ids = list(Profile.objects.filter(user__in=created).values_list('id', flat=True))
+
+    for profile in Profile.objects.filter(id__in=profile_ids):
+        profile.follows.add(*rnd.sample(profile_ids, min(follows, len(profile_ids))))
+
+    note_ids = []
+    for i in range(notes):
+        note = Note.objects.create(
+            user=rnd.choice(created), title=f'Title {i}', note='lorem ipsum ' * rnd.randint(5, 100),
+        )
+        note_ids.append(note.id)
+
+    read_posts = Note.read_posts.through
+    read_posts.objects.bulk_create(
+        [read_posts(note_id=rnd.choice(note_ids), profile_id=rnd.choice(profile_ids)) for _ in range(reads)],
+        ignore_conflicts=True,
+    )
+
+    return User.objects.get(pk=created[0].pk)
+
+
+def get_endpoints(note_id, profile_id):
+    """ Все адреса из blog_api/urls.py с подставленными id: в accounts/ - профиля, в остальных - поста """
+    endpoints = []
+    for pattern in urls.urlpatterns:
+        route = str(pattern.pattern)
+        view_class = pattern.callback.view_class
+        # по queryset представления модель не определить: например, у читателей поста его нет
+        pk = profile_id if route.startswith('accounts/') else note_id
+        method = 'get' if hasattr(view_class, 'get') else 'post'
+        endpoints.append({
+            'route': route,
+            'url': '/' + route.replace('<int:pk>', str(pk)) + QUERY_STRINGS.get(route, ''),
+            'method': method,
+            'note_id': note_id,
+            'is_list': hasattr(view_class, 'list'),
+        })
+    return endpoints
+
+
+def get_user_endpoints(user):
+    """ Адреса для замеров: последний пост и профиль пользователя """
+    note = Note.objects.order_by('-id').first()
+    endpoints = get_endpoints(note.id if note else 1, user.profile.id)
+    for endpoint in endpoints:
+        endpoint['username'] = user.username
+    return endpoints
+
+
+def get_payload(endpoint, counter):
+    """ Тело POST-запроса для адресов без GET """
+    counter[0] += 1
+    route = endpoint['route']
+    if route == 'accounts/signup/':
+        # регистрация: каждый запрос - новый пользователь
+        return {'username': f'bench_signup_{counter[0]}', 'password': 'benchmark'}
+    if route == 'accounts/token/':
+        # у всех пользователей из seed один пароль
+        return {'username': endpoint['username'], 'password': 'benchmark'}
+    if route == 'notes/bulk/':
+        return {'notes': [{'title': f'Bulk {counter[0]} {i}', 'note': 'lorem ipsum ' * 20} for i in range(10)]}
+    if route == 'notes/read/':
+        return {'ids': [endpoint['note_id']]}
+    return {}
+
+
+def request(client, endpoint, counter):
+    if endpoint['method'] == 'post':
+        return client.post(endpoint['url'], get_payload(endpoint, counter), content_type='application/json')
+    response = client.get(endpoint['url'])
+    if response.streaming:
+        # потоковый ответ читает базу только при чтении тела
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(client, endpoint, repeat=20, warm_cache=False):
+    """ Число запросов к базе, p50/p95 задержки и пиковая память одного адреса """
+    counter = [time.monotonic_ns()]
+    timings = []
+    queries = None
+
+    for _ in range(repeat):
+        if not warm_cache:
+            cache.get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = request(client, endpoint, counter)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(ctx.captured_queries)
+
+    if not warm_cache:
+        cache.get_cache().clear()
+    tracemalloc.start()
+    request(client, endpoint, counter)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    quantiles = statistics.quantiles(timings, n=20) if len(timings) > 1 else timings * 19
+    return {
+        'url': endpoint['url'],
+        'method': endpoint['method'].upper(),
+        'status': response.status_code,
+        'queries': queries,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(quantiles[18], 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def queries_by_page_size(client, endpoint, sizes=LIST_PAGE_SIZES):
+    """ Число запросов списка при разных размерах страницы: должно быть одинаковым """
+    result = {}
+    for size in sizes:
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(PageNumberPagination, 'page_size', size))
+            stack.enter_context(mock.patch.object(KeysetPagination, 'page_size', size))
+            cache.get_cache().clear()
+            with CaptureQueriesContext(connection) as ctx:
+                client.get(endpoint['url'])
+        result[size] = len(ctx.captured_queries)
+    return result
+
+
+def run(user, repeat=20, warm_cache=False):
+    """
+    Замер всех адресов. Возвращает словарь, пригодный для сохранения в JSON.
+    Прочтения записываются сразу: фоновая запись буфера мешала бы замерам.
+    Кеш ответов на время замера - отдельный, в памяти процесса (BENCHMARK_CACHES)
+    """
+    caches = {**settings.CACHES, **BENCHMARK_CACHES}
+    with override_settings(READ_RECEIPTS_FLUSH_INTERVAL=0, CACHES=caches, BLOG_CACHE_ALIAS='benchmark'):
+        client = Client()
+        client.force_login(user)
+
+        results = {}
+        for endpoint in get_user_endpoints(user):
+            results[endpoint['route']] = measure(client, endpoint, repeat, warm_cache)
+            if endpoint['is_list']:
+                results[endpoint['route']]['queries_by_page_size'] = queries_by_page_size(client, endpoint)
+    return results
+
+
+def growing_endpoints(results):
+    """ Адреса, у которых число запросов растёт вместе с размером страницы (N+1) """
+    return sorted(
+        route for route, result in results.items()
+        if len(set(result.get('queries_by_page_size', {}).values())) > 1
+    )
+
+
+@contextmanager
+def serve():
+    """
+    Локальный ASGI-сервер uvicorn на свободном порту в фоновом потоке со своим циклом событий.
+    Как и в работе под ASGI, асинхронные представления выполняются в цикле событий,
+    а синхронные - в потоках через sync_to_async, каждое со своим соединением с базой
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    config = uvicorn.Config(get_asgi_application(), lifespan='off', access_log=False, log_level='warning')
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError('ASGI server failed to start')
+            time.sleep(0.01)
+        yield f'http://127.0.0.1:{sock.getsockname()[1]}'
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+def fetch(url, headers):
+    """ Один HTTP-запрос: (время в мс, ошибка ли ответ) """
+    start = time.perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers)) as response:
+            response.read()
+        failed = False
+    except HTTPError as exc:
+        exc.read()
+        failed = exc.code >= 400
+    except URLError:
+        failed = True
+    return (time.perf_counter() - start) * 1000, failed
+
+
+def load(url, headers, requests=200, concurrency=20):
+    """ requests HTTP-запросов к адресу из concurrency потоков, каждый со своим соединением """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        responses = list(pool.map(lambda _: fetch(url, headers), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for timing, _ in responses]
+    quantiles = statistics.quantiles(timings, n=20) if len(timings) > 1 else timings * 19
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(failed for _, failed in responses),
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(quantiles[18], 3),
+    }
+
+
+def load_test(base_url, user, requests=200, concurrency=20):
+    """
+    Сравнение синхронных и асинхронных адресов под одновременными запросами к настоящему серверу.
+    Данные должны быть закоммичены: сервер читает их из своих соединений. Вход - по токену.
+    Прочтения, как и в работе, буферизуются: немедленная запись из каждого потока упёрлась бы
+    в блокировку SQLite и мерила бы её, а не представления
+    """
+    headers = {'Authorization': f'Bearer {authentication.make_token(user)}'}
+    endpoints = {endpoint['route']: endpoint for endpoint in get_user_endpoints(user)}
+
+    results = {}
+    for sync_route, async_route in LOAD_TEST_PAIRS:
+        results[sync_route] = {
+            'sync': load(base_url + endpoints[sync_route]['url'], headers, requests, concurrency),
+            'async': load(base_url + endpoints[async_route]['url'], headers, requests, concurrency),
+        }
+    return results
+
+
+def delete_seed(seed=0):
+    """ Удаляем данные seed(): посты, затем пользователей с профилями, подписками и прочтениями """
+    users = User.objects.filter(username__startswith=f'bench_{seed}_')
+    Note.objects.filter(user__in=users).delete()
+    users.delete()
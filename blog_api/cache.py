@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+NOTE = 'note'
+PROFILE = 'profile'
+FEED = 'feed'
+KINDS = (NOTE, PROFILE, FEED)
+
+# параметры запроса, меняющие представление объекта: такие ответы не кешируются
+REPRESENTATION_PARAMS = ('date_format', 'excerpt', 'fields', 'exclude')
+# поля, зависящие от пользователя: в общий кеш объектов не попадают
+USER_FIELDS = ('is_read',)
+
+
+def get_cache():
+    """ Бэкенд задаётся в CACHES: locmem в тестах и разработке, Redis в продакшене """
+    return caches[settings.BLOG_CACHE_ALIAS]
+
+
+def is_cacheable(request):
+    return not any(param in request.query_params for param in REPRESENTATION_PARAMS)
+
+
+def shared_payload(data):
+    return {name: value for name, value in data.items() if name not in USER_FIELDS}
+
+
+def make_key(kind, *parts):
+    return ':'.join(['blog', kind, *map(str, parts)])
+
+
+def incr(key, delta):
+    cache = get_cache()
+    if not cache.add(key, delta, timeout=None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # ключ успел пропасть между add и incr
+            cache.add(key, delta, timeout=None)
+
+
+def count(kind, hits=0, misses=0):
+    """ Счётчики попаданий и промахов хранятся в самом кеше, чтобы быть общими для процессов """
+    if hits:
+        incr(make_key('stats', kind, 'hit'), hits)
+    if misses:
+        incr(make_key('stats', kind, 'miss'), misses)
+
+
+def stats():
+    cache = get_cache()
+    keys = {
+        (kind, name): make_key('stats', kind, name)
+        for kind in KINDS for name in ('hit', 'miss')
+    }
+    values = cache.get_many(keys.values())
+
+    return {
+        kind: {
+            'hits': values.get(keys[kind, 'hit'], 0),
+            'misses': values.get(keys[kind, 'miss'], 0),
+        }
+        for kind in KINDS
+    }
+
+
+def get_object(kind, pk):
+    data = get_cache().get(make_key(kind, pk))
+    count(kind, hits=int(data is not None), misses=int(data is None))
+    return data
+
+
+def set_object(kind, pk, data):
+    get_cache().set(make_key(kind, pk), shared_payload(data), settings.BLOG_CACHE_TIMEOUT)
+
+
+def get_objects(kind, pks):
+    """ Возвращает словарь {pk: data} только для найденных в кеше объектов """
+    keys = {make_key(kind, pk): pk for pk in pks}
+    found = get_cache().get_many(keys.keys())
+    count(kind, hits=len(found), misses=len(keys) - len(found))
+
+    return {keys[key]: data for key, data in found.items()}
+
+
+def set_objects(kind, items):
+    get_cache().set_many(
+        {make_key(kind, pk): shared_payload(data) for pk, data in items.items()},
+        settings.BLOG_CACHE_TIMEOUT,
+    )
+
+
+def invalidate(kind, pks):
+    """ Сбрасываем закешированные объекты, их версии (ETag) и время изменения (Last-Modified) """
+    pks = list(pks)
+    get_cache().delete_many(
+        [make_key(kind, pk, *suffix) for pk in pks for suffix in ((), ('version',), ('modified',))]
+    )
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        cache.set(key, version, timeout=None)
+    return version
+
+
+def get_modified(key):
+    """ Время изменения из кеша. Если ключ сброшен или вытеснен, изменение считается только что случившимся """
+    cache = get_cache()
+    modified = cache.get(key)
+    if modified is None:
+        modified = time.time()
+        cache.set(key, modified, timeout=None)
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def object_version(kind, pk):
+    """ Версия объекта: меняется при каждом invalidate, входит в ETag """
+    return get_version(make_key(kind, pk, 'version'))
+
+
+def object_modified(kind, pk):
+    """ Время последнего invalidate объекта, входит в Last-Modified """
+    return get_modified(make_key(kind, pk, 'modified'))
+
+
+def feed_version(profile_id):
+    """ Версия ленты профиля: входит в ключ страниц и ETag, смена версии сбрасывает все страницы """
+    return get_version(make_key(FEED, profile_id, 'version'))
+
+
+def feed_modified(profile_id):
+    """ Время последней смены версии ленты профиля, входит в Last-Modified """
+    return get_modified(make_key(FEED, profile_id, 'modified'))
+
+
+def bump_feeds(profile_ids):
+    """ Сбрасываем закешированные страницы лент профилей и отмечаем время изменения одним запросом к кешу """
+    if profile_ids:
+        now = time.time()
+        versions = {}
+        for profile_id in profile_ids:
+            versions[make_key(FEED, profile_id, 'version')] = uuid4().hex
+            versions[make_key(FEED, profile_id, 'modified')] = now
+        get_cache().set_many(versions, timeout=None)
+
+
+def feed_page_key(profile_id, path):
+    # в путь входят параметры фильтров и пагинации
+    return make_key(FEED, profile_id, feed_version(profile_id), md5(path.encode()).hexdigest())
+
+
+def get_feed_page(key):
+    page = get_cache().get(key)
+    count(FEED, hits=int(page is not None), misses=int(page is None))
+    return page
+
+
+def set_feed_page(key, page):
+    # ленты авторов с подтягиванием при чтении не сбрасываются при публикации, поэтому срок жизни короткий
+    get_cache().set(key, page, settings.BLOG_CACHE_FEED_TIMEOUT)
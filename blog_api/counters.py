@@ -0,0 +1,53 @@
+from django.db.models import F
+
+from blog_api.models import Profile, Note, count_subquery
+
+Read = Note.read_posts.through
+Follow = Profile.follows.through
+
+
+def id_batches(queryset, batch_size):
+    """ Разбиваем таблицу на диапазоны id, чтобы пересчитывать её короткими транзакциями """
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield queryset.filter(id__gte=ids[0], id__lte=ids[-1])
+        last_id = ids[-1]
+
+
+def add_views(note_ids, amount):
+    """ Атомарно увеличиваем счётчик просмотров постов """
+    Note.objects.filter(id__in=note_ids).update(views=F('views') + amount)
+
+
+def rebuild_views(queryset=None):
+    """ Пересчитываем счётчик просмотров по таблице read_posts """
+    if queryset is None:
+        queryset = Note.objects.all()
+
+    return queryset.update(views=count_subquery(Read.objects, 'note_id'))
+
+
+def add_profile_counts(queryset, **deltas):
+    """ Атомарно меняем счётчики профилей, например add_profile_counts(profiles, notes_count=1) """
+    queryset.update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def rebuild_profile_counts(queryset=None):
+    """ Пересчитываем счётчики профилей по таблицам постов и подписок """
+    if queryset is None:
+        queryset = Profile.objects.all()
+
+    return queryset.update(
+        notes_count=count_subquery(Note.objects, 'user_id', 'user_id'),
+        follows_count=count_subquery(Follow.objects, 'from_profile_id'),
+        followers_count=count_subquery(Follow.objects, 'to_profile_id'),
+    )
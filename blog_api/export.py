@@ -0,0 +1,61 @@
+import csv
+import json
+from itertools import islice
+
+from blog_api import feed, reads
+from blog_api.models import Note
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+SCOPES = ('notes', 'feed')
+
+
+class Echo:
+    """ Файлоподобный объект для csv.writer: возвращает строку вместо записи в буфер """
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(profile, scope, fields):
+    """ Собственные посты профиля или его лента, сначала свежие. Прочтение - подзапросом, без запроса на пост """
+    if scope == 'feed':
+        queryset = feed.feed_notes(profile)
+    else:
+        queryset = Note.objects.filter(user_id=profile.user_id).order_by('-create_at', '-id')
+
+    if 'is_read' in fields:
+        queryset = queryset.annotate(is_read=reads.is_read_by(profile.pk))
+    return queryset
+
+
+def iter_notes(serializer, queryset, chunk_size):
+    """
+    Посты пачками по chunk_size из курсора базы (в PostgreSQL - серверного),
+    поэтому память не зависит от числа постов
+    """
+    rows = serializer.get_values(queryset).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield serializer.to_representation(chunk)
+
+
+def ndjson_lines(serializer, queryset, chunk_size):
+    """ Один JSON-объект на строку, одна строка ответа на пачку постов """
+    for notes in iter_notes(serializer, queryset, chunk_size):
+        yield ''.join(json.dumps(note, ensure_ascii=False) + '\n' for note in notes)
+
+
+def csv_lines(serializer, queryset, chunk_size):
+    """ Заголовок с именами полей, затем по строке на пост """
+    writer = csv.writer(Echo())
+    yield writer.writerow(serializer.fields)
+    for notes in iter_notes(serializer, queryset, chunk_size):
+        yield ''.join(writer.writerow([note[name] for name in serializer.fields]) for note in notes)
+
+
+def export_lines(output, serializer, queryset, chunk_size):
+    if output == 'csv':
+        return csv_lines(serializer, queryset, chunk_size)
+    return ndjson_lines(serializer, queryset, chunk_size)
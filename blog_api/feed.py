@@ -0,0 +1,226 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from blog_api.models import Profile, Note, FeedItem
+
+Follow = Profile.follows.through
+# ключ страниц ленты: аннотации feed_queryset с копиями create_at и id поста
+FEED_KEYSET_FIELDS = ('feed_create_at', 'feed_note_id')
+FEED_ORDERING = tuple(f'-{name}' for name in FEED_KEYSET_FIELDS)
+
+
+def fan_out_note(note):
+    """ Раскладываем новый пост по лентам подписчиков автора. Возвращает id этих подписчиков """
+    return fan_out_notes(note.user_id, [note])
+
+
+def fan_out_notes(user_id, notes):
+    """ Раскладываем новые посты одного автора по лентам подписчиков. Возвращает id этих подписчиков """
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    follower_ids = list(
+        Follow.objects
+        .filter(to_profile__user_id=user_id)
+        .values_list('from_profile_id', flat=True)[:limit + 1]
+    )
+
+    if len(follower_ids) > limit:
+        # Слишком много подписчиков - посты автора будут подтягиваться при чтении ленты
+        Profile.objects.filter(user_id=user_id).update(is_pull_author=True)
+        return []
+
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(profile_id=profile_id, note_id=note.id, create_at=note.create_at)
+            for note in notes
+            for profile_id in follower_ids
+        ],
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return follower_ids
+
+
+def backfill(profile_id, author_ids):
+    """ При подписке добавляем в ленту последние посты авторов """
+    notes = Note.objects \
+        .filter(user__profile__in=author_ids, user__profile__is_pull_author=False) \
+        .order_by('-create_at') \
+        .values_list('id', 'create_at')[:settings.FEED_BACKFILL_SIZE]
+
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(profile_id=profile_id, note_id=note_id, create_at=create_at)
+            for note_id, create_at in notes
+        ],
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_authors(profile_id, author_ids=None):
+    """ При отписке убираем посты авторов из ленты (None - все посты) """
+    items = FeedItem.objects.filter(profile_id=profile_id)
+    if author_ids is not None:
+        items = items.filter(note__user__profile__in=author_ids)
+    items.delete()
+
+
+class MergedQuerySet:
+    """
+    Несколько querysets постов с одинаковым порядком, которые читаются как один список.
+    Фильтры и аннотации применяются к каждому, а при срезе каждый читается со своим LIMIT
+    по своему индексу, и результаты сливаются. Части не должны пересекаться
+    """
+    ordered = True
+
+    def __init__(self, *querysets, reverse=False):
+        self.querysets = querysets
+        self.model = querysets[0].model
+        self.reverse = reverse
+
+    def map(self, func):
+        """ Применяем func к каждой части, например фильтры django-filter, которые принимают только QuerySet """
+        return MergedQuerySet(*map(func, self.querysets), reverse=self.reverse)
+
+    def apply(self, name, *args, **kwargs):
+        return self.map(lambda queryset: getattr(queryset, name)(*args, **kwargs))
+
+    def all(self):
+        return self.apply('all')
+
+    def filter(self, *args, **kwargs):
+        return self.apply('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self.apply('exclude', *args, **kwargs)
+
+    def distinct(self, *fields):
+        return self.apply('distinct', *fields)
+
+    def annotate(self, *args, **kwargs):
+        return self.apply('annotate', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self.apply('select_related', *fields)
+
+    def values(self, *fields):
+        return self.apply('values', *fields)
+
+    def order_by(self, *fields):
+        """ Поддерживается только порядок ленты: по ключу (create_at, id) по убыванию или возрастанию """
+        merged = self.apply('order_by', *fields)
+        merged.reverse = not fields[0].startswith('-')
+        return merged
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    async def acount(self):
+        return sum([await queryset.acount() for queryset in self.querysets])
+
+    @staticmethod
+    def get_key(item):
+        if isinstance(item, dict):
+            return item['create_at'], item['id']
+        return item.create_at, item.id
+
+    def merge(self, querysets):
+        return heapq.merge(*querysets, key=self.get_key, reverse=not self.reverse)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return list(self[index:index + 1])[0]
+
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            return list(islice(self.merge(self.querysets), start, None))
+        # каждой части достаточно первых stop записей
+        return list(islice(self.merge([queryset[:stop] for queryset in self.querysets]), start, stop))
+
+    async def aslice(self, start, stop):
+        """ Срез [start:stop] асинхронным ORM: каждая часть читается со своим LIMIT stop """
+        parts = [[item async for item in queryset[:stop]] for queryset in self.querysets]
+        return list(islice(self.merge(parts), start, stop))
+
+    def __iter__(self):
+        return iter(self.merge(self.querysets))
+
+    def __len__(self):
+        return self.count()
+
+
+def inbox_queryset(profile):
+    """
+    Посты материализованной ленты. Порядок и ключ страниц - столбцы FeedItem (копии create_at и id поста),
+    поэтому ORDER BY ... LIMIT читается диапазоном индекса feed_item_profile_idx без сортировки всей ленты
+    """
+    return Note.objects \
+        .filter(feed_items__profile=profile) \
+        .annotate(feed_create_at=F('feed_items__create_at'), feed_note_id=F('feed_items__note')) \
+        .order_by(*FEED_ORDERING)
+
+
+def pull_queryset(user_id):
+    """
+    Посты автора с подтягиванием при чтении. Для одного автора ORDER BY ... LIMIT читается
+    диапазоном индекса note_user_create_at_idx, а с user_id__in пришлось бы сортировать все посты авторов
+    """
+    return Note.objects \
+        .filter(user_id=user_id) \
+        .annotate(feed_create_at=F('create_at'), feed_note_id=F('id')) \
+        .order_by(*FEED_ORDERING)
+
+
+def pull_user_ids_queryset(profile):
+    return profile.follows.filter(is_pull_author=True).values_list('user_id', flat=True)
+
+
+def get_pull_user_ids(profile):
+    return list(pull_user_ids_queryset(profile))
+
+
+def feed_queryset(profile):
+    """
+    Посты ленты профиля, сначала свежие. Ключ страниц - аннотации feed_create_at и feed_note_id.
+    С авторами с подтягиванием - отдельно упорядоченные запросы к материализованной ленте и к постам
+    каждого такого автора, которые сливаются при чтении страницы
+    """
+    return build_feed_queryset(profile, get_pull_user_ids(profile))
+
+
+async def afeed_queryset(profile):
+    """ feed_queryset для асинхронных представлений: авторы с подтягиванием читаются асинхронным ORM """
+    return build_feed_queryset(profile, [user_id async for user_id in pull_user_ids_queryset(profile)])
+
+
+def build_feed_queryset(profile, pull_user_ids):
+    if not pull_user_ids:
+        # Обычный случай: лента читается по индексу (profile, -create_at, -note)
+        return inbox_queryset(profile)
+
+    # посты, разложенные до того, как автор стал подтягиваемым, читаются из второй части
+    inbox = inbox_queryset(profile).exclude(user_id__in=pull_user_ids)
+    return MergedQuerySet(inbox, *map(pull_queryset, pull_user_ids))
+
+
+def feed_notes(profile):
+    """ Все посты ленты одним queryset'ом для поиска и выгрузки, сначала свежие """
+    pull_user_ids = get_pull_user_ids(profile)
+    if not pull_user_ids:
+        return inbox_queryset(profile)
+
+    inbox = FeedItem.objects.filter(profile=profile).values('note_id')
+    return Note.objects \
+        .filter(Q(id__in=inbox) | Q(user_id__in=pull_user_ids)) \
+        .order_by('-create_at', '-id')
+
+
+def newest_create_at(profile):
+    """ Время самого свежего поста ленты """
+    queryset = feed_queryset(profile)
+    parts = queryset.querysets if isinstance(queryset, MergedQuerySet) else [queryset]
+    dates = [date for date in (part.values_list('create_at', flat=True).first() for part in parts) if date]
+    return max(dates, default=None)
@@ -0,0 +1,18 @@
+from django_filters import rest_framework as filters
+
+from blog_api.models import Note
+from blog_api.reads import is_read_by
+
+
+class FeedFilter(filters.FilterSet):
+    """ Фильтры ленты. ?unread=true|false - непрочитанные или прочитанные текущим пользователем посты """
+    unread = filters.BooleanFilter(method='filter_unread')
+
+    class Meta:
+        model = Note
+        fields = ['read_posts']
+
+    def filter_unread(self, queryset, name, value):
+        # EXISTS не размножает строки в отличие от JOIN по read_posts
+        read = is_read_by(self.request.user.profile.pk)
+        return queryset.filter(~read if value else read)
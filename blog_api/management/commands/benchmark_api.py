@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from blog_api import benchmark
+from blog_api.reads import read_buffer
+
+
+class Command(BaseCommand):
+    """ Замер числа запросов, задержки и памяти всех адресов blog_api на синтетических данных """
+    help = 'Benchmark every blog_api endpoint on a synthetic dataset and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=5, help='follows per user')
+        parser.add_argument('--notes', type=int, default=500)
+        parser.add_argument('--reads', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint')
+        parser.add_argument('--warm-cache', action='store_true', help='do not clear the response cache between requests')
+        parser.add_argument('--output', help='path of the JSON results file (stdout by default)')
+        parser.add_argument('--check', action='store_true', help='fail if a list query count grows with page size')
+        parser.add_argument('--keep', action='store_true', help='keep the synthetic data instead of rolling it back')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*']):
+            user = benchmark.seed(
+                users=options['users'], follows=options['follows'], notes=options['notes'],
+                reads=options['reads'], seed=options['seed'],
+            )
+            results = benchmark.run(user, repeat=options['repeat'], warm_cache=options['warm_cache'])
+
+            # прочтения из замеров не должны попасть в базу
+            read_buffer.clear()
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        report = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
+
+        growing = benchmark.growing_endpoints(results)
+        if options['check'] and growing:
+            raise CommandError(f'Query count grows with page size: {", ".join(growing)}')
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_api import export
+from blog_api.models import Profile
+from blog_api.serializers import NoteDateTimeField, NoteSerializer, NoteValuesSerializer
+
+
+class Command(BaseCommand):
+    """ Выгрузка постов пользователя или его ленты в NDJSON или CSV, как /notes/export/ """
+    help = "Stream a user's notes or feed as NDJSON or CSV in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--scope', choices=export.SCOPES, default='notes')
+        parser.add_argument('--output-format', choices=tuple(export.FORMATS), default='ndjson')
+        parser.add_argument('--fields', help=f'comma-separated subset of {",".join(NoteSerializer.Meta.fields)}')
+        parser.add_argument('--date-format', choices=tuple(NoteDateTimeField.formats), default='iso')
+        parser.add_argument('--output', help='path of the output file (stdout by default)')
+        parser.add_argument('--chunk-size', type=int, default=settings.BLOG_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        profile = Profile.objects.filter(user__username=options['username']).first()
+        if profile is None:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+
+        fields = NoteSerializer.Meta.fields
+        if options['fields']:
+            fields = [name.strip() for name in options['fields'].split(',') if name.strip()]
+            unknown = set(fields) - set(NoteSerializer.Meta.fields)
+            if unknown:
+                raise CommandError(f'Unknown fields: {", ".join(sorted(unknown))}')
+
+        serializer = NoteValuesSerializer(fields=fields, date_format=options['date_format'])
+        queryset = export.export_queryset(profile, options['scope'], serializer.fields)
+        lines = export.export_lines(options['output_format'], serializer, queryset, options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,92 @@
+import csv
+import sys
+from itertools import islice
+
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog_api.models import create_profiles
+
+FIELDS = ('username', 'password', 'email', 'first_name', 'last_name')
+
+
+class Command(BaseCommand):
+    """ Массовый импорт пользователей из CSV пачками: пользователи, профили и подписки на себя через bulk_create """
+    stealth_options = ('stdin',)
+    help = (
+        'Import users from a CSV file with a header row '
+        '(username, password, email, first_name, last_name; only username is required)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file, "-" for stdin')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--iterations', type=int,
+            help='password hasher iterations for imported passwords (default: hasher default). '
+                 'Cheaper hashes are upgraded to the default cost on the first login',
+        )
+
+    def handle(self, *args, **options):
+        self.hasher = get_hasher()
+        self.iterations = options['iterations']
+        if self.iterations is not None and not hasattr(self.hasher, 'iterations'):
+            raise CommandError(f'Hasher {self.hasher.algorithm} has no configurable iterations')
+
+        if options['path'] == '-':
+            stdin = options.get('stdin', sys.stdin)
+            created, skipped = self.import_rows(csv.DictReader(stdin), options['batch_size'])
+        else:
+            with open(options['path'], newline='') as f:
+                created, skipped = self.import_rows(csv.DictReader(f), options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} users, skipped {skipped}'))
+
+    def import_rows(self, rows, batch_size):
+        created = skipped = 0
+        rows = iter(rows)
+        while batch := list(islice(rows, batch_size)):
+            batch_created = self.import_batch(batch)
+            created += batch_created
+            skipped += len(batch) - batch_created
+        return created, skipped
+
+    def import_batch(self, rows):
+        """ Одна транзакция на пачку: существующие и повторяющиеся имена пропускаются """
+        users = {}
+        for row in rows:
+            username = (row.get('username') or '').strip()
+            if username and username not in users:
+                users[username] = row
+
+        existing = set(User.objects.filter(username__in=users).values_list('username', flat=True))
+        new_users = [
+            User(
+                username=username,
+                password=self.hash_password(row.get('password')),
+                **{field: row.get(field) or '' for field in FIELDS[2:]},
+            )
+            for username, row in users.items() if username not in existing
+        ]
+        if not new_users:
+            return 0
+
+        with transaction.atomic():
+            # bulk_create не отправляет post_save, поэтому профили создаём сами
+            User.objects.bulk_create(new_users)
+            user_ids = list(
+                User.objects
+                .filter(username__in=[user.username for user in new_users])
+                .values_list('id', flat=True)
+            )
+            create_profiles(user_ids)
+        return len(new_users)
+
+    def hash_password(self, password):
+        if not password:
+            return make_password(None)
+        if self.iterations is None:
+            return make_password(password, hasher=self.hasher)
+        return self.hasher.encode(password, self.hasher.salt(), iterations=self.iterations)
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from blog_api import benchmark
+from blog_api.reads import read_buffer
+
+
+class Command(BaseCommand):
+    """ Нагрузочное сравнение синхронных (DRF) и асинхронных адресов чтения на синтетических данных """
+    help = (
+        'Compare sync and async read endpoints under concurrent HTTP requests and write the results as JSON. '
+        'Without --url the endpoints are served by a local uvicorn ASGI server'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=5, help='follows per user')
+        parser.add_argument('--notes', type=int, default=500)
+        parser.add_argument('--reads', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=20, help='simultaneous requests')
+        parser.add_argument(
+            '--url', help='base URL of a running server using the same database '
+                          '(default: start a local uvicorn ASGI server)',
+        )
+        parser.add_argument('--keep', action='store_true', help='keep the synthetic data instead of deleting it')
+        parser.add_argument('--output', help='path of the JSON results file (stdout by default)')
+
+    def handle(self, *args, **options):
+        # сервер читает данные из своих соединений, поэтому они коммитятся и удаляются после замера
+        user = benchmark.seed(
+            users=options['users'], follows=options['follows'], notes=options['notes'],
+            reads=options['reads'], seed=options['seed'],
+        )
+        try:
+            if options['url']:
+                server = options['url']
+                endpoints = benchmark.load_test(
+                    options['url'].rstrip('/'), user,
+                    requests=options['requests'], concurrency=options['concurrency'],
+                )
+            else:
+                server = 'local uvicorn ASGI server'
+                with override_settings(ALLOWED_HOSTS=['*']), benchmark.serve() as url:
+                    endpoints = benchmark.load_test(
+                        url, user, requests=options['requests'], concurrency=options['concurrency'],
+                    )
+        finally:
+            # прочтения из замеров не должны попасть в базу
+            read_buffer.clear()
+            if not options['keep']:
+                benchmark.delete_seed(options['seed'])
+
+        report = json.dumps({'server': server, 'endpoints': endpoints}, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
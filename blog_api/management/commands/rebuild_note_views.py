@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog_api.counters import id_batches, rebuild_views
+from blog_api.models import Note
+
+
+class Command(BaseCommand):
+    """ Пересчёт счётчика просмотров постов по таблице read_posts """
+    help = 'Rebuild Note.views from the read_posts table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        updated = 0
+        for batch in id_batches(Note.objects.all(), options['batch_size']):
+            updated += rebuild_views(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt views for {updated} notes'))
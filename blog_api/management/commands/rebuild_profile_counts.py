@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog_api.counters import id_batches, rebuild_profile_counts
+from blog_api.models import Profile
+
+
+class Command(BaseCommand):
+    """ Пересчёт счётчиков постов, подписок и подписчиков профилей """
+    help = 'Rebuild Profile notes/follows/followers counters from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        updated = 0
+        for batch in id_batches(Profile.objects.all(), options['batch_size']):
+            updated += rebuild_profile_counts(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} profiles'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_api import search
+from blog_api.counters import id_batches
+from blog_api.models import Note
+
+
+class Command(BaseCommand):
+    """ Пересчёт поисковых векторов постов, например после смены BLOG_SEARCH_CONFIG """
+    help = 'Rebuild Note.search_vector from note titles and texts (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not search.is_full_text():
+            raise CommandError('Full-text search index is only used on PostgreSQL')
+
+        updated = 0
+        for batch in id_batches(Note.objects.all(), options['batch_size']):
+            updated += search.update_vectors(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search vectors for {updated} notes'))
@@ -0,0 +1,58 @@
+import json
+import time
+from argparse import ArgumentTypeError
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blog_api import seeding
+
+
+def aware_datetime(value):
+    """ Дата и время в ISO 8601, без часового пояса - UTC """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ArgumentTypeError(f'"{value}" is not an ISO 8601 datetime')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, timezone.utc)
+
+
+class Command(BaseCommand):
+    """ Генерация данных производственного масштаба: пользователи, граф подписок, посты и прочтения """
+    help = (
+        'Seed the database with users, a power-law follow graph, notes and read receipts '
+        'using bulk inserts; the same --seed produces the same data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=20, help='average follows per user')
+        parser.add_argument('--notes', type=int, default=10000)
+        parser.add_argument('--reads', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=365, help='spread note creation times over this many days')
+        parser.add_argument(
+            '--until', type=aware_datetime, default=seeding.EPOCH,
+            help='newest possible note creation time (ISO 8601, UTC by default); notes are spread back from it',
+        )
+        parser.add_argument('--alpha', type=float, default=1.0, help='power-law exponent of popularity and activity')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed', help='username prefix: <prefix>_<n>')
+        parser.add_argument('--password', default='seed', help='password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be positive')
+        if User.objects.filter(username__startswith=f'{options["prefix"]}_').exists():
+            raise CommandError(f'Users with prefix "{options["prefix"]}_" already exist, choose another --prefix')
+
+        start = time.perf_counter()
+        result = seeding.seed(
+            users=options['users'], follows=options['follows'], notes=options['notes'], reads=options['reads'],
+            days=options['days'], alpha=options['alpha'], seed=options['seed'], prefix=options['prefix'],
+            password=options['password'], until=options['until'], batch_size=options['batch_size'],
+        )
+        result['seconds'] = round(time.perf_counter() - start, 1)
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(result)))
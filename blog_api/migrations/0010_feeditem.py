@@ -0,0 +1,51 @@
+# Generated by Django 4.0.6 on 2026-10-18 15:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """ Раскладываем уже существующие посты по лентам подписчиков одним INSERT ... SELECT """
+    Note = apps.get_model('blog_api', 'Note')
+    FeedItem = apps.get_model('blog_api', 'FeedItem')
+
+    select = Note.objects \
+        .filter(user__profile__followed_by__isnull=False) \
+        .values_list('user__profile__followed_by', 'id', 'create_at')
+    sql, params = select.query.sql_with_params()
+
+    columns = ', '.join(FeedItem._meta.get_field(name).column for name in ('profile', 'note', 'create_at'))
+    schema_editor.execute(f'INSERT INTO {FeedItem._meta.db_table} ({columns}) {sql}', params)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0009_remove_note_read_user_remove_profile_read_posts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='is_pull_author',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_at', models.DateTimeField()),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='blog_api.note')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='blog_api.profile')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['profile', '-create_at', '-note'], name='feed_item_profile_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('profile', 'note'), name='feed_item_unique'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
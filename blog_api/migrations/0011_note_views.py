@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 15:28
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_views(apps, schema_editor):
+    """ Заполняем счётчик просмотров по уже существующим прочтениям """
+    Note = apps.get_model('blog_api', 'Note')
+    Read = Note.read_posts.through
+
+    reads = Read.objects \
+        .filter(note_id=OuterRef('pk')) \
+        .order_by() \
+        .values('note_id') \
+        .annotate(cnt=Count('*')) \
+        .values('cnt')
+    Note.objects.update(views=Coalesce(Subquery(reads, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0010_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='views',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+        migrations.RunPython(fill_views, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.0.6 on 2026-10-18 15:36
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field, outer_field='pk'):
+    queryset = queryset \
+        .filter(**{field: OuterRef(outer_field)}) \
+        .order_by() \
+        .values(field) \
+        .annotate(cnt=Count('*')) \
+        .values('cnt')
+    return Coalesce(Subquery(queryset, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """ Заполняем счётчики профилей по уже существующим постам и подпискам """
+    Profile = apps.get_model('blog_api', 'Profile')
+    Note = apps.get_model('blog_api', 'Note')
+    Follow = Profile.follows.through
+
+    Profile.objects.update(
+        notes_count=count_subquery(Note.objects, 'user_id', 'user_id'),
+        follows_count=count_subquery(Follow.objects, 'from_profile_id'),
+        followers_count=count_subquery(Follow.objects, 'to_profile_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0011_note_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follows_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='notes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-notes_count', 'id'], name='profile_notes_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
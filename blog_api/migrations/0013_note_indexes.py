@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0012_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-create_at', '-id'], name='note_create_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-create_at', '-id'], name='note_user_create_at_idx'),
+        ),
+        # Промежуточная таблица read_posts создаётся автоматически, поэтому индекс задаём вручную:
+        # уникальный индекс (note_id, profile_id) не помогает выбрать прочитанное профилем
+        migrations.RunSQL(
+            'CREATE INDEX read_posts_profile_note_idx ON blog_api_note_read_posts (profile_id, note_id);',
+            'DROP INDEX read_posts_profile_note_idx;',
+        ),
+    ]
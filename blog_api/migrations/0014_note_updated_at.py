@@ -0,0 +1,28 @@
+# Generated by Django 4.0.6 on 2026-10-18 16:02
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_updated_at(apps, schema_editor):
+    """ Существующие посты считаем не изменявшимися после создания """
+    Note = apps.get_model('blog_api', 'Note')
+    Note.objects.update(updated_at=F('create_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0013_note_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Время изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.6 on 2026-10-18 16:29
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# GIN-индекс создаётся только в PostgreSQL, поэтому его нет в Meta.indexes модели
+SEARCH_INDEX = GinIndex(fields=['search_vector'], name='note_search_vector_idx')
+
+
+def create_search_index(apps, schema_editor):
+    """ Индекс и заполнение search_vector для существующих постов """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Note = apps.get_model('blog_api', 'Note')
+    schema_editor.add_index(Note, SEARCH_INDEX)
+
+    config = settings.BLOG_SEARCH_CONFIG
+    Note.objects.using(schema_editor.connection.alias).update(
+        search_vector=SearchVector('title', weight='A', config=config) + SearchVector('note', weight='B', config=config),
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('blog_api', 'Note'), SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_api', '0015_profile_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
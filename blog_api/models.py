@@ -1,9 +1,23 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 
+def count_subquery(queryset, field, outer_field='pk'):
+    """ Подзапрос COUNT(*) по связанной таблице: не размножает строки и не грузит сами записи """
+    queryset = queryset \
+        .filter(**{field: OuterRef(outer_field)}) \
+        .order_by() \
+        .values(field) \
+        .annotate(cnt=Count('*')) \
+        .values('cnt')
+    return Coalesce(Subquery(queryset, output_field=IntegerField()), 0)
+
+
 class Profile(models.Model):
     """ Модель для профиля пользователя """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -13,19 +27,57 @@ class Profile(models.Model):
         symmetrical=False,
         blank=True
     )
+    # автор с очень большим числом подписчиков: его посты не раскладываются
+    # по лентам при публикации, а подтягиваются при чтении ленты
+    is_pull_author = models.BooleanField(default=False)
+
+    # счётчики поддерживаются сигналами (см. blog_api.signals), пересчёт - rebuild_profile_counts
+    notes_count = models.PositiveIntegerField(default=0)
+    follows_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    # версия токенов доступа: увеличение отзывает все выданные токены (см. blog_api.authentication)
+    token_version = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('notes_count', 'follows_count', 'followers_count', 'token_version')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-notes_count', 'id'], name='profile_notes_count_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        """ Счётчики меняются только атомарными UPDATE, поэтому при сохранении профиля их не перезаписываем """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+def create_profiles(user_ids):
+    """
+    Профили новых пользователей с подпиской на себя, без сигналов m2m:
+    у нового профиля нет постов для ленты, а счётчики сразу учитывают подписку на себя
+    """
+    Profile.objects.bulk_create([
+        Profile(user_id=user_id, follows_count=1, followers_count=1) for user_id in user_ids
+    ])
+    profile_ids = Profile.objects.filter(user_id__in=user_ids).values_list('id', flat=True)
+    Profile.follows.through.objects.bulk_create([
+        Profile.follows.through(from_profile_id=profile_id, to_profile_id=profile_id) for profile_id in profile_ids
+    ])
+
 
 @receiver(post_save, sender=User)
 def create_profile(instance, created, **kwargs):
-    """ Функция создания профиля при создании пользователя и подписка на себя же """
+    """ Функция создания профиля при создании пользователя и подписка на себя же: два INSERT """
     if created:
-        user_profile = Profile(user=instance)
-        user_profile.save()
-        user_profile.follows.set([instance.profile.id])
-        user_profile.save()
+        user_profile = Profile.objects.create(user=instance, follows_count=1, followers_count=1)
+        Profile.follows.through.objects.create(from_profile_id=user_profile.pk, to_profile_id=user_profile.pk)
 
 
 class Note(models.Model):
@@ -39,12 +91,18 @@ class Note(models.Model):
     )
     note = models.TextField(verbose_name='Текст поста')
     create_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+    # время последнего изменения поста, используется для Last-Modified и ETag
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
 
     read_posts = models.ManyToManyField(
         Profile,
         symmetrical=False,
         blank=True
     )
+    # количество прочитавших пост, поддерживается сигналами на read_posts
+    views = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
+    # заголовок и текст для полнотекстового поиска в PostgreSQL, поддерживается сигналом (см. blog_api.search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return (
@@ -55,3 +113,29 @@ class Note(models.Model):
 
     class Meta:
         get_latest_by = 'create_at'
+        indexes = [
+            # общий список постов и постраничный вывод по ключу (create_at, id)
+            models.Index(fields=['-create_at', '-id'], name='note_create_at_idx'),
+            # посты автора: авторы с подтягиванием в ленте, дозаполнение ленты при подписке
+            models.Index(fields=['user', '-create_at', '-id'], name='note_user_create_at_idx'),
+        ]
+
+
+class FeedItem(models.Model):
+    """ Материализованная лента: пост, разложенный в ленту подписчика при публикации """
+    profile = models.ForeignKey(
+        Profile, related_name='feed_items', on_delete=models.CASCADE
+    )
+    note = models.ForeignKey(
+        Note, related_name='feed_items', on_delete=models.CASCADE
+    )
+    # копия Note.create_at, чтобы лента читалась одним проходом по индексу
+    create_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'note'], name='feed_item_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['profile', '-create_at', '-note'], name='feed_item_profile_idx'),
+        ]
@@ -0,0 +1,196 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+async def aslice(queryset, start, stop):
+    """ Срез queryset'а асинхронным ORM. MergedQuerySet (лента) читает каждую часть своим запросом """
+    if hasattr(queryset, 'aslice'):
+        return await queryset.aslice(start, stop)
+    return [item async for item in queryset[start:stop]]
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (create_at, id), сначала свежие.
+    В отличие от PageNumberPagination не делает COUNT(*) и OFFSET,
+    поэтому любая страница стоит столько же, сколько первая.
+    """
+    page_size = PageNumberPagination.page_size
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # поля queryset'а с ключом: представление может заменить их атрибутом keyset_fields,
+    # например лента сортируется по копиям create_at и id в FeedItem
+    keyset_fields = ('create_at', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(await aslice(queryset, 0, self.page_size + 1))
+
+    def get_page_queryset(self, queryset, request, view):
+        """ Записи после ключа из курсора в порядке страницы, без LIMIT """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request)
+        position = self.position
+        create_at_field, id_field = getattr(view, 'keyset_fields', self.keyset_fields)
+
+        if position is not None:
+            create_at, pk = position
+            lookup = 'gt' if self.reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{create_at_field}__{lookup}': create_at})
+                | Q(**{create_at_field: create_at, f'{id_field}__{lookup}': pk})
+            )
+
+        if self.reverse:
+            return queryset.order_by(create_at_field, id_field)
+        return queryset.order_by(f'-{create_at_field}', f'-{id_field}')
+
+    def set_page(self, results):
+        """ Страница из page_size + 1 прочитанных записей: лишняя запись говорит, что есть следующая """
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @staticmethod
+    def get_position(item):
+        """ Ключ записи: поддерживаем как модели, так и словари из .values() """
+        if isinstance(item, dict):
+            return item['create_at'], item['id']
+        return item.create_at, item.id
+
+    def encode_cursor(self, item, reverse):
+        create_at, pk = self.get_position(item)
+        raw = f'{create_at.isoformat()}|{pk}|{int(reverse)}'
+        cursor = urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            raw = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            create_at, pk, reverse = raw.split('|')
+            return (datetime.fromisoformat(create_at), int(pk)), bool(int(reverse))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class NotePagination(PageNumberPagination):
+    """
+    Постраничный вывод для ленты и списка постов.
+    По умолчанию - номера страниц, по ключу - при ?pagination=cursor,
+    заголовке X-Pagination: cursor или переданном ?cursor=.
+    """
+    pagination_query_param = 'pagination'
+    pagination_header = 'HTTP_X_PAGINATION'
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.pagination_query_param) == 'cursor'
+            or request.META.get(self.pagination_header) == 'cursor'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset для асинхронных представлений: COUNT и страница читаются асинхронным ORM,
+        номер страницы и ошибки - как в PageNumberPagination
+        """
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        # Paginator.count - cached_property, заранее посчитанное значение он не пересчитывает
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        # границы страницы - как в Paginator.page
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        self.page = Page(await aslice(queryset, bottom, top), number, paginator)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ProfileCursorPagination(CursorPagination):
+    """ Списки профилей по курсору: id уникален, поэтому курсор - чистый ключ без OFFSET """
+    ordering = 'id'
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+
+from blog_api import cache
+from blog_api.counters import rebuild_views
+from blog_api.models import Profile, Note
+
+logger = logging.getLogger(__name__)
+
+Read = Note.read_posts.through
+
+
+class ReadBuffer:
+    """
+    Буфер прочтений постов. Отметки копятся в памяти процесса и
+    записываются пачкой фоновым потоком раз в READ_RECEIPTS_FLUSH_INTERVAL
+    секунд или при заполнении буфера до READ_RECEIPTS_MAX_BUFFER.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.receipts = set()
+        self.worker = None
+
+    def add(self, note_id, profile_id):
+        with self.lock:
+            self.receipts.add((note_id, profile_id))
+            size = len(self.receipts)
+
+        self.start_worker()
+        if size >= settings.READ_RECEIPTS_MAX_BUFFER:
+            self.wakeup.set()
+
+    def clear(self):
+        """ Отбрасываем накопленные прочтения без записи """
+        with self.lock:
+            self.receipts = set()
+
+    def flush(self):
+        """ Записываем накопленные прочтения одной транзакцией """
+        with self.lock:
+            receipts, self.receipts = self.receipts, set()
+
+        if not receipts:
+            return 0
+
+        try:
+            return write_reads(receipts)
+        except Exception:
+            # прочтения возвращаются в буфер и записываются при следующем сбросе
+            with self.lock:
+                self.receipts |= receipts
+            raise
+
+    def start_worker(self):
+        if self.worker is not None:
+            return
+
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='read-receipts', daemon=True)
+                self.worker.start()
+                atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(settings.READ_RECEIPTS_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush read receipts')
+            finally:
+                connections.close_all()
+
+
+read_buffer = ReadBuffer()
+
+
+def write_reads(receipts):
+    """
+    Записываем пары (note_id, profile_id) одной транзакцией, повторные прочтения пропускаются.
+    Прочтения удалённых постов и профилей отбрасываются: ignore_conflicts не спасает от ошибки
+    внешнего ключа, и одна такая пара откатила бы всю пачку. Возвращает число записанных пар
+    """
+    with transaction.atomic():
+        note_ids = set(Note.objects.filter(id__in={note_id for note_id, _ in receipts}).values_list('id', flat=True))
+        profile_ids = set(
+            Profile.objects.filter(id__in={profile_id for _, profile_id in receipts}).values_list('id', flat=True)
+        )
+        receipts = [
+            (note_id, profile_id) for note_id, profile_id in receipts
+            if note_id in note_ids and profile_id in profile_ids
+        ]
+        if not receipts:
+            return 0
+
+        Read.objects.bulk_create(
+            [Read(note_id=note_id, profile_id=profile_id) for note_id, profile_id in receipts],
+            batch_size=settings.READ_RECEIPTS_MAX_BUFFER,
+            ignore_conflicts=True,
+        )
+        # bulk_create не отправляет m2m_changed, поэтому пересчитываем счётчики
+        # и сбрасываем кеш сами
+        note_ids = {note_id for note_id, _ in receipts}
+        rebuild_views(Note.objects.filter(id__in=note_ids))
+
+    cache.invalidate(cache.NOTE, note_ids)
+    cache.bump_feeds({profile_id for _, profile_id in receipts})
+    return len(receipts)
+
+
+def is_buffered():
+    return settings.READ_RECEIPTS_FLUSH_INTERVAL > 0
+
+
+def record_read(note, profile_id):
+    """ Отмечаем пост прочитанным. При нулевом интервале - сразу, иначе через буфер """
+    if is_buffered():
+        read_buffer.add(note.pk, profile_id)
+    else:
+        note.read_posts.add(profile_id)
+
+
+async def arecord_read(note, profile_id):
+    """ record_read для асинхронных представлений: буфер не обращается к базе, немедленная запись - через aadd """
+    if is_buffered():
+        read_buffer.add(note.pk, profile_id)
+    else:
+        await note.read_posts.aadd(profile_id)
+
+
+def is_read_by(profile_id):
+    """ EXISTS-подзапрос "пост прочитан профилем" по индексу (profile_id, note_id) """
+    return Exists(Read.objects.filter(note_id=OuterRef('pk'), profile_id=profile_id))
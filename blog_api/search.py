@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+
+
+def is_full_text():
+    """ Полнотекстовый поиск по индексу есть только в PostgreSQL, в остальных базах - поиск по подстроке """
+    return connection.vendor == 'postgresql'
+
+
+def note_vector():
+    """ Заголовок весит больше текста поста """
+    config = settings.BLOG_SEARCH_CONFIG
+    return SearchVector('title', weight='A', config=config) + SearchVector('note', weight='B', config=config)
+
+
+def update_vectors(queryset):
+    """ Пересчитываем Note.search_vector одним UPDATE """
+    if not is_full_text():
+        return 0
+    return queryset.update(search_vector=note_vector())
+
+
+def search(queryset, q):
+    """ Посты, подходящие под запрос, с аннотацией rank: сначала наиболее подходящие, затем свежие """
+    if is_full_text():
+        query = SearchQuery(q, config=settings.BLOG_SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset \
+            .filter(search_vector=query) \
+            .annotate(rank=SearchRank(F('search_vector'), query))
+    else:
+        # запасной вариант для SQLite: все слова запроса есть в заголовке или тексте, совпадение в заголовке важнее
+        condition = Q()
+        rank = Value(0.0)
+        for word in q.split():
+            condition &= Q(title__icontains=word) | Q(note__icontains=word)
+            rank += Case(When(title__icontains=word, then=Value(1.0)), default=Value(0.4))
+        queryset = queryset \
+            .filter(condition) \
+            .annotate(rank=rank)
+
+    return queryset.order_by('-rank', '-create_at', '-id')
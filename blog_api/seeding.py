@@ -0,0 +1,193 @@
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from blog_api import counters, search
+from blog_api.models import Profile, Note, FeedItem, create_profiles
+
+Read = Note.read_posts.through
+Follow = Profile.follows.through
+# время создания постов отсчитывается назад от этой даты, чтобы один seed давал одни и те же данные
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et '
+    'dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea '
+    'commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum eu fugiat nulla pariatur'
+).split()
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def power_law_weights(count, alpha):
+    """ Накопленные веса закона Ципфа: k-й по популярности элемент выбирается с весом 1 / k^alpha """
+    return list(accumulate(1 / (rank + 1) ** alpha for rank in range(count)))
+
+
+def by_popularity(rnd, ids):
+    """ Случайный порядок популярности, чтобы она не зависела от id """
+    ids = list(ids)
+    rnd.shuffle(ids)
+    return ids
+
+
+def make_text(rnd, median, sigma=1.0):
+    """ Текст логнормальной длины в словах: много коротких постов и редкие длинные """
+    words = max(1, round(rnd.lognormvariate(0, sigma) * median))
+    return ' '.join(rnd.choices(WORDS, k=words))
+
+
+def seed_users(count, prefix, password, batch_size):
+    """
+    Пользователи и профили пачками, без сигнала create_profile на каждую строку.
+    Возвращает {id профиля: id пользователя}
+    """
+    password = make_password(password)
+    user_ids = {}
+    for batch in chunks(range(count), batch_size):
+        with transaction.atomic():
+            last_id = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            User.objects.bulk_create([User(username=f'{prefix}_{i}', password=password) for i in batch])
+            created = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True))
+            create_profiles(created)
+        user_ids.update(
+            Profile.objects.filter(user_id__gt=last_id).order_by('id').values_list('id', 'user_id')
+        )
+    return user_ids
+
+
+def seed_follows(rnd, profile_ids, follows, alpha, batch_size):
+    """
+    Граф подписок со степенным распределением подписчиков: немногие авторы собирают большую часть подписок.
+    Число подписок у профиля - экспоненциальное со средним follows. Возвращает число подписчиков профилей
+    """
+    popular = by_popularity(rnd, profile_ids)
+    weights = power_law_weights(len(popular), alpha)
+
+    # каждый профиль уже подписан на себя
+    followers = dict.fromkeys(profile_ids, 1)
+    rows = []
+    for profile_id in profile_ids:
+        count = min(len(profile_ids) - 1, round(rnd.expovariate(1 / follows))) if follows else 0
+        targets = set(rnd.choices(popular, cum_weights=weights, k=count)) - {profile_id}
+        for target in sorted(targets):
+            followers[target] += 1
+            rows.append(Follow(from_profile_id=profile_id, to_profile_id=target))
+
+    for batch in chunks(rows, batch_size):
+        Follow.objects.bulk_create(batch)
+    return followers
+
+
+def fan_out(notes):
+    """
+    Раскладываем посты по лентам подписчиков одним INSERT ... SELECT, как это сделал бы сигнал fan_out_note:
+    строки ленты не проходят через Python, а это большая часть всех вставляемых строк
+    """
+    select = notes \
+        .filter(user__profile__is_pull_author=False, user__profile__followed_by__isnull=False) \
+        .values_list('user__profile__followed_by', 'id', 'create_at')
+    sql, params = select.query.sql_with_params()
+
+    table = FeedItem._meta.db_table
+    columns = ', '.join(FeedItem._meta.get_field(name).column for name in ('profile', 'note', 'create_at'))
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+
+
+def set_timestamps(note_ids, timestamps):
+    """
+    bulk_create проставляет create_at и updated_at текущим временем (auto_now_add, auto_now),
+    поэтому время создания записываем следом: один UPDATE ... CASE WHEN на пачку
+    """
+    rows = [Note(pk=pk, create_at=create_at, updated_at=create_at) for pk, create_at in zip(note_ids, timestamps)]
+    Note.objects.bulk_update(rows, ['create_at', 'updated_at'])
+
+
+def seed_notes(rnd, user_ids, followers, notes, alpha, days, until, batch_size):
+    """
+    Посты пачками: активность авторов тоже степенная, время создания - за days дней до until.
+    Возвращает id постов
+    """
+    active = by_popularity(rnd, user_ids)
+    weights = power_law_weights(len(active), alpha)
+
+    # авторы со слишком большим числом подписчиков подтягиваются в ленту при чтении
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    pull_authors = {profile_id for profile_id, count in followers.items() if count > limit}
+    Profile.objects.filter(id__in=pull_authors).update(is_pull_author=True)
+
+    note_ids = []
+    for batch in chunks(range(notes), batch_size):
+        authors = rnd.choices(active, cum_weights=weights, k=len(batch))
+        rows = []
+        timestamps = []
+        for profile_id in authors:
+            rows.append(Note(
+                user_id=user_ids[profile_id], title=make_text(rnd, 6, 0.5)[:300], note=make_text(rnd, 80),
+            ))
+            timestamps.append(until - timedelta(seconds=rnd.uniform(0, days * 24 * 60 * 60)))
+
+        with transaction.atomic():
+            last_id = Note.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            Note.objects.bulk_create(rows)
+            created = list(Note.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True))
+            # строки ленты копируют create_at поста, поэтому раскладываем после записи времени
+            set_timestamps(created, timestamps)
+            fan_out(Note.objects.filter(id__gt=last_id))
+            search.update_vectors(Note.objects.filter(id__gt=last_id))
+        note_ids += created
+    return note_ids
+
+
+def seed_reads(rnd, profile_ids, note_ids, reads, alpha, batch_size):
+    """ Прочтения: популярные посты читают чаще, повторные пары отбрасываются """
+    popular = by_popularity(rnd, note_ids)
+    weights = power_law_weights(len(popular), alpha)
+
+    for batch in chunks(range(reads), batch_size):
+        read_notes = rnd.choices(popular, cum_weights=weights, k=len(batch))
+        readers = rnd.choices(profile_ids, k=len(batch))
+        Read.objects.bulk_create(
+            [Read(note_id=note_id, profile_id=profile_id) for note_id, profile_id in zip(read_notes, readers)],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_counters(profile_ids, note_ids, batch_size):
+    """ bulk_create не отправляет сигналы, поэтому счётчики пересчитываем по таблицам """
+    if profile_ids:
+        for batch in counters.id_batches(Profile.objects.filter(id__gte=min(profile_ids)), batch_size):
+            counters.rebuild_profile_counts(batch)
+    if note_ids:
+        for batch in counters.id_batches(Note.objects.filter(id__gte=min(note_ids)), batch_size):
+            counters.rebuild_views(batch)
+
+
+def seed(users=1000, follows=20, notes=10000, reads=50000, days=365, alpha=1.0,
+         seed=0, prefix='seed', password='seed', until=EPOCH, batch_size=5000):
+    """ Данные производственного масштаба: при одних seed и until получается один и тот же набор """
+    rnd = random.Random(seed)
+
+    user_ids = seed_users(users, prefix, password, batch_size)
+    profile_ids = list(user_ids)
+    followers = seed_follows(rnd, profile_ids, follows, alpha, batch_size)
+    note_ids = seed_notes(rnd, user_ids, followers, notes, alpha, days, until, batch_size)
+    if note_ids:
+        seed_reads(rnd, profile_ids, note_ids, reads, alpha, batch_size)
+    rebuild_counters(profile_ids, note_ids, batch_size)
+
+    return {
+        'users': len(profile_ids),
+        'follows': sum(followers.values()) - len(followers),
+        'notes': len(note_ids),
+        'reads': Read.objects.filter(note_id__gte=min(note_ids)).count() if note_ids else 0,
+    }
@@ -1,19 +1,96 @@
-from datetime import datetime
-
+from django.conf import settings
+from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from rest_framework import serializers
+from django.db import transaction
+from django.db.models.functions import Substr
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import SAFE_METHODS
 
+from blog_api import export
 from blog_api.models import Profile, Note
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteDateTimeField(serializers.DateTimeField):
+    """
+    Дата поста. Форматируется сразу из значения модели,
+    формат задаётся в serializer'е или в запросе (?date_format=iso)
+    """
+    query_param = 'date_format'
+    formats = {
+        'iso': ISO_8601,
+        'human': '%d %B %Y - %H:%M',
+    }
+
+    def __init__(self, format=formats['human'], **kwargs):
+        kwargs.setdefault('read_only', True)
+        super().__init__(format=format, **kwargs)
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        # формат определяется один раз на serializer, а не для каждой записи
+        request = self.context.get('request')
+        if request is not None:
+            self.format = self.formats.get(request.query_params.get(self.query_param), self.format)
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей ответа: ?fields=a,b оставляет только перечисленные, ?exclude=a,b убирает.
+    Убранные поля не вычисляются, а представления по get_requested_fields сокращают запросы.
+    Действует только на чтение, при записи serializer остаётся полным
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        names = self.get_requested_fields(request)
+        for name in list(self.fields):
+            if name not in names:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """ Поля ответа для запроса в порядке Meta.fields """
+        names = tuple(cls.Meta.fields)
+        if request.method not in SAFE_METHODS:
+            return names
+
+        fields = cls.parse_field_names(request, cls.fields_query_param, names)
+        exclude = cls.parse_field_names(request, cls.exclude_query_param, names)
+        return tuple(
+            name for name in names
+            if (fields is None or name in fields) and (exclude is None or name not in exclude)
+        )
+
+    @staticmethod
+    def parse_field_names(request, param, names):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = requested - set(names)
+        if unknown:
+            raise serializers.ValidationError({param: [f'Unknown fields: {", ".join(sorted(unknown))}.']})
+        return requested
+
+
+class NoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализация данных для постов """
     user = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True
     )
 
-    views = serializers.SerializerMethodField()
+    create_at = NoteDateTimeField()
+    views = serializers.IntegerField(read_only=True)
+    # аннотация reads.is_read_by для текущего пользователя
+    is_read = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Note
@@ -21,69 +98,121 @@ class NoteSerializer(serializers.ModelSerializer):
             'id', 'title', 'note', 'create_at',
             'user',
             'views',
+            'is_read',
         )
 
-    def to_representation(self, instance):
-        """ Переопределение вывода. Меняем формат даты в ответе """
-        ret = super().to_representation(instance)
-        # Конвертируем строку в дату по формату
-        create_at = datetime.strptime(ret['create_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        # Конвертируем дату в строку в новом формате
-        ret['create_at'] = create_at.strftime('%d %B %Y - %H:%M')
-        # :%S
-        return ret
-
-    def get_views(self, obj):
-        return obj.read_posts.count()
-
-
-class NoteDetailSerializer(serializers.ModelSerializer):
-    """ Сериализация данных для отдельного поста """
-    class AccountUsernameSerializer(serializers.ModelSerializer):
-        """ Сериализация данных для получения username """
-        user = serializers.SlugRelatedField(
-            slug_field='username',
-            read_only=True
-        )
-
-        class Meta:
-            model = Profile
-            fields = ['user', ]
 
+class NoteValuesSerializer:
+    """
+    Быстрая сериализация списков постов из строк .values() без полей DRF.
+    Результат совпадает с NoteSerializer, дата форматируется тем же полем.
+    С ?excerpt=N вместо текста поста из базы читаются только первые N символов,
+    с ?fields / ?exclude читаются только нужные столбцы
+    """
+    fields = NoteSerializer.Meta.fields
+    # поле ответа -> поле .values()
+    sources = {'user': 'user__username'}
+    # ключ постраничного вывода читается всегда, даже если поля не попадают в ответ
+    key_fields = ('id', 'create_at')
+    excerpt_query_param = 'excerpt'
+
+    def __init__(self, context=None, fields=None, date_format=None):
+        context = context or {}
+        request = context.get('request')
+        if fields is not None:
+            self.fields = tuple(fields)
+        elif request is not None:
+            self.fields = NoteSerializer.get_requested_fields(request)
+
+        self.excerpt = self.get_excerpt(request)
+        if self.excerpt is not None:
+            self.sources = {**self.sources, 'note': 'note_excerpt'}
+
+        # формат даты с учётом ?date_format, как в NoteSerializer
+        date_field = NoteDateTimeField()
+        if date_format is not None:
+            date_field.format = date_field.formats[date_format]
+        date_field.bind('create_at', serializers.Serializer(context=context))
+        self.to_dict = self.compile(date_field.to_representation)
+
+    def get_excerpt(self, request):
+        value = request.query_params.get(self.excerpt_query_param) if request is not None else None
+        if value is None or 'note' not in self.fields:
+            return None
+        try:
+            excerpt = int(value)
+        except ValueError:
+            excerpt = 0
+        if excerpt < 1:
+            raise serializers.ValidationError({self.excerpt_query_param: ['A positive integer is required.']})
+        return excerpt
+
+    def compile(self, format_date):
+        """ Функция строка -> словарь собирается один раз на запрос """
+        columns = tuple((name, self.sources.get(name, name)) for name in self.fields)
+        date_column = 'create_at' if 'create_at' in self.fields else None
+
+        def to_dict(row):
+            data = {name: row[source] for name, source in columns}
+            if date_column is not None:
+                data[date_column] = format_date(data[date_column])
+            return data
+
+        return to_dict
+
+    def get_values(self, queryset):
+        if self.excerpt is not None:
+            # полный текст остаётся в базе, его отдаёт только /notes/<pk>/
+            queryset = queryset.annotate(note_excerpt=Substr('note', 1, self.excerpt))
+
+        columns = [self.sources.get(name, name) for name in self.fields]
+        columns += [name for name in self.key_fields if name not in columns]
+        return queryset.values(*columns)
+
+    def to_representation(self, rows):
+        return [self.to_dict(row) for row in rows]
+
+
+class NoteDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ Сериализация данных для отдельного поста. Список прочитавших - /notes/<pk>/readers/ """
     user = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True
     )
 
-    read_posts = AccountUsernameSerializer(many=True, read_only=True)
+    create_at = NoteDateTimeField()
+    is_read = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Note
         fields = (
             'id', 'title', 'note', 'create_at',
             'user',
-            'read_posts',
+            'is_read',
         )
 
-    def to_representation(self, instance):
-        """ Переопределение вывода. Меняем формат даты в ответе """
-        ret = super().to_representation(instance)
-        # Конвертируем строку в дату по формату
-        create_at = datetime.strptime(ret['create_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        # Конвертируем дату в строку в новом формате
-        ret['create_at'] = create_at.strftime('%d %B %Y - %H:%M')
-        return ret
+
+class AccountUsernameSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ Сериализация данных для получения username """
+    user = serializers.SlugRelatedField(
+        slug_field='username',
+        read_only=True
+    )
+
+    class Meta:
+        model = Profile
+        fields = ['user', ]
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализация данных для списка пользователей """
     user = serializers.SlugRelatedField(
                 slug_field='username',
                 read_only=True
             )
 
-    follow_count = serializers.SerializerMethodField()
-    notes_count = serializers.SerializerMethodField()
+    follow_count = serializers.IntegerField(source='follows_count', read_only=True)
+    notes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Profile
@@ -93,14 +222,8 @@ class AccountSerializer(serializers.ModelSerializer):
             'notes_count',
         ]
 
-    def get_follow_count(self, obj):
-        return obj.follows.count()
 
-    def get_notes_count(self, obj):
-        return obj.user.note.count()
-
-
-class AccountFollowsSerializer(serializers.ModelSerializer):
+class AccountFollowsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализация данных для просмотра подписок """
     class AccountUsernameSerializer(serializers.ModelSerializer):
         """ Сериализация данных для получения username """
@@ -128,7 +251,7 @@ class AccountFollowsSerializer(serializers.ModelSerializer):
         ]
 
 
-class AccountDetailSerializer(serializers.ModelSerializer):
+class AccountDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализация данных для детального просмотра профиля """
 
     user = serializers.SlugRelatedField(
@@ -136,8 +259,8 @@ class AccountDetailSerializer(serializers.ModelSerializer):
         read_only=True
     )
 
-    follow_count = serializers.SerializerMethodField()
-    notes_count = serializers.SerializerMethodField()
+    follow_count = serializers.IntegerField(source='follows_count', read_only=True)
+    notes_count = serializers.IntegerField(read_only=True)
     first_name = serializers.SerializerMethodField()
     last_name = serializers.SerializerMethodField()
     email = serializers.SerializerMethodField()
@@ -163,12 +286,6 @@ class AccountDetailSerializer(serializers.ModelSerializer):
     def get_first_name(self, obj):
         return obj.user.first_name
 
-    def get_follow_count(self, obj):
-        return obj.follows.count()
-
-    def get_notes_count(self, obj):
-        return obj.user.note.count()
-
 
 class UserSignUpSerializer(serializers.ModelSerializer):
     """ Сериализация данных для регистрации пользователя """
@@ -179,7 +296,61 @@ class UserSignUpSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = User(**validated_data)
-        # Хэшируем пароль
+        # Хэшируем пароль до транзакции, чтобы не держать её открытой во время хеширования
         user.set_password(validated_data['password'])
-        user.save()
+        # пользователь, профиль и подписка на себя - одна транзакция из трёх INSERT
+        with transaction.atomic():
+            user.save()
         return user
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    """ Имя и пароль для получения токена доступа """
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True, style={'input_type': 'password'})
+
+    def validate(self, attrs):
+        user = authenticate(request=self.context.get('request'), **attrs)
+        if user is None:
+            raise serializers.ValidationError('Unable to log in with provided credentials.')
+        attrs['user'] = user
+        return attrs
+
+
+class BulkBatchMixin:
+    """ Ограничение размера пакета в пакетных запросах """
+
+    def validate_batch(self, value):
+        if len(value) > settings.BULK_MAX_BATCH_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.BULK_MAX_BATCH_SIZE} elements.'
+            )
+        return value
+
+
+class BulkNoteSerializer(BulkBatchMixin, serializers.Serializer):
+    """ Пакет постов для создания. Каждый пост проверяется NoteSerializer отдельно """
+    notes = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_notes(self, value):
+        return self.validate_batch(value)
+
+
+class BulkReadSerializer(BulkBatchMixin, serializers.Serializer):
+    """ Пакет id постов для отметки прочитанными """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        return self.validate_batch(value)
+
+
+class NoteSearchSerializer(serializers.Serializer):
+    """ Параметры поиска постов: запрос и область - все посты или лента """
+    q = serializers.CharField(max_length=200)
+    scope = serializers.ChoiceField(choices=('all', 'feed'), default='all')
+
+
+class NoteExportSerializer(serializers.Serializer):
+    """ Параметры выгрузки постов: формат и область - свои посты или лента """
+    output = serializers.ChoiceField(choices=tuple(export.FORMATS), default='ndjson')
+    scope = serializers.ChoiceField(choices=export.SCOPES, default='notes')
@@ -0,0 +1,186 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from blog_api import feed, counters, cache, authentication, search
+from blog_api.models import Profile, Note
+
+# поля пользователя, которые попадают в AccountDetailSerializer
+PROFILE_USER_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+# поля поста, из которых строится search_vector
+SEARCH_NOTE_FIELDS = {'title', 'note'}
+
+
+@receiver(post_save, sender=Note)
+def fan_out_note(instance, created, **kwargs):
+    """ Новый пост попадает в ленты подписчиков автора """
+    if created:
+        follower_ids = feed.fan_out_note(instance)
+        cache.bump_feeds(follower_ids)
+
+
+@receiver(post_save, sender=Note)
+def update_search_vector(instance, update_fields, **kwargs):
+    """ Поисковый вектор пересчитывается при создании поста и изменении заголовка или текста """
+    if update_fields is not None and not SEARCH_NOTE_FIELDS & set(update_fields):
+        # например, сохранение только счётчика просмотров
+        return
+
+    search.update_vectors(Note.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Profile.follows.through)
+def sync_feed_on_follow(instance, action, reverse, pk_set, **kwargs):
+    """ Подписка добавляет посты автора в ленту, отписка - убирает """
+    if reverse:
+        # изменение со стороны автора (followed_by): обновляем ленту каждого подписчика
+        if action == 'post_add':
+            for profile_id in pk_set:
+                feed.backfill(profile_id, [instance.pk])
+        elif action == 'post_remove':
+            for profile_id in pk_set:
+                feed.remove_authors(profile_id, [instance.pk])
+        elif action == 'pre_clear':
+            for profile_id in instance.followed_by.values_list('id', flat=True):
+                feed.remove_authors(profile_id, [instance.pk])
+        return
+
+    if action == 'post_add':
+        feed.backfill(instance.pk, pk_set)
+    elif action == 'post_remove':
+        feed.remove_authors(instance.pk, pk_set)
+    elif action == 'post_clear':
+        feed.remove_authors(instance.pk)
+
+
+@receiver(m2m_changed, sender=Note.read_posts.through)
+def update_views(instance, action, reverse, pk_set, **kwargs):
+    """ Поддерживаем счётчик просмотров поста при изменении read_posts """
+    if not reverse:
+        if action == 'post_add':
+            # в post_add pk_set содержит только действительно добавленные записи
+            counters.add_views([instance.pk], len(pk_set))
+        elif action == 'post_remove':
+            counters.rebuild_views(Note.objects.filter(pk=instance.pk))
+        elif action == 'post_clear':
+            Note.objects.filter(pk=instance.pk).update(views=0)
+        else:
+            return
+        instance.refresh_from_db(fields=['views'])
+        return
+
+    # изменение со стороны профиля (profile.note_set)
+    if action == 'post_add':
+        counters.add_views(pk_set, 1)
+    elif action == 'post_remove':
+        counters.rebuild_views(Note.objects.filter(id__in=pk_set))
+    elif action == 'pre_clear':
+        counters.add_views(instance.note_set.values('id'), -1)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_cache(instance, created=False, **kwargs):
+    """ Сбрасываем кеш поста, а при создании и удалении - и профиль автора (число постов) """
+    cache.invalidate(cache.NOTE, [instance.pk])
+
+    if created or kwargs['signal'] is post_delete:
+        cache.invalidate(cache.PROFILE, Profile.objects.filter(user_id=instance.user_id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache(instance, created, update_fields, **kwargs):
+    """ Изменение имени или почты пользователя сбрасывает кеш его профиля """
+    if created or (update_fields is not None and not PROFILE_USER_FIELDS & set(update_fields)):
+        # например, обновление last_login при входе
+        return
+
+    cache.invalidate(cache.PROFILE, Profile.objects.filter(user=instance).values_list('id', flat=True))
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_password_change(instance, update_fields, **kwargs):
+    """ Смена пароля отзывает все выданные токены пользователя """
+    if instance.pk is None or (update_fields is not None and 'password' not in update_fields):
+        return
+    # сохранение с update_fields=['last_login'] при входе не читает пароль из базы
+    password = User.objects.filter(pk=instance.pk).values_list('password', flat=True).first()
+    if password is not None and password != instance.password:
+        authentication.revoke_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_principal(instance, created=False, **kwargs):
+    """ Имя, права и активность пользователя хранятся в кеше токенов """
+    if not created:
+        authentication.invalidate_principal(instance.pk)
+
+
+@receiver(m2m_changed, sender=Profile.follows.through)
+def invalidate_follows_cache(instance, action, reverse, pk_set, **kwargs):
+    """ Подписка меняет профиль подписчика и его ленту """
+    if reverse and action == 'pre_clear':
+        profile_ids = list(instance.followed_by.values_list('id', flat=True))
+    elif reverse and action in ('post_add', 'post_remove'):
+        profile_ids = list(pk_set)
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        profile_ids = [instance.pk]
+    else:
+        return
+
+    cache.invalidate(cache.PROFILE, profile_ids)
+    cache.bump_feeds(profile_ids)
+
+
+@receiver(m2m_changed, sender=Note.read_posts.through)
+def invalidate_reads_cache(instance, action, reverse, pk_set, **kwargs):
+    """ Прочтение меняет число просмотров поста и фильтр прочитанных в ленте """
+    if reverse:
+        if action in ('post_add', 'post_remove'):
+            cache.invalidate(cache.NOTE, pk_set)
+        elif action == 'pre_clear':
+            cache.invalidate(cache.NOTE, instance.note_set.values_list('id', flat=True))
+        else:
+            return
+        cache.bump_feeds([instance.pk])
+        return
+
+    if action in ('post_add', 'post_remove'):
+        cache.bump_feeds(pk_set)
+    elif action != 'post_clear':
+        return
+    cache.invalidate(cache.NOTE, [instance.pk])
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def update_notes_count(instance, created=False, **kwargs):
+    """ Счётчик постов автора """
+    if created:
+        delta = 1
+    elif kwargs['signal'] is post_delete:
+        delta = -1
+    else:
+        return
+
+    counters.add_profile_counts(Profile.objects.filter(user_id=instance.user_id), notes_count=delta)
+
+
+@receiver(m2m_changed, sender=Profile.follows.through)
+def update_follow_counts(instance, action, reverse, pk_set, **kwargs):
+    """ Счётчики подписок и подписчиков. Выполняется в транзакции изменения follows """
+    # со стороны подписчика меняется follows_count, со стороны автора - followers_count
+    own_counter, other_counter = ('followers_count', 'follows_count') if reverse else ('follows_count', 'followers_count')
+
+    if action == 'post_add':
+        # в post_add pk_set содержит только действительно добавленные записи
+        counters.add_profile_counts(Profile.objects.filter(pk=instance.pk), **{own_counter: len(pk_set)})
+        counters.add_profile_counts(Profile.objects.filter(id__in=pk_set), **{other_counter: 1})
+    elif action == 'post_remove':
+        counters.rebuild_profile_counts(Profile.objects.filter(id__in={instance.pk, *pk_set}))
+    elif action == 'pre_clear':
+        related = instance.followed_by if reverse else instance.follows
+        counters.add_profile_counts(related.all(), **{other_counter: -1})
+    elif action == 'post_clear':
+        counters.rebuild_profile_counts(Profile.objects.filter(pk=instance.pk))
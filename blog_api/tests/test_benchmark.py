@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.test import LiveServerTestCase, TestCase, override_settings
+
+from blog_api import benchmark, urls
+from blog_api.cache import get_cache
+from blog_api.models import Note
+from blog_api.reads import read_buffer
+
+
+class TestBenchmark(TestCase):
+    """
+    TESTS:
+    1. Замер проходит по всем адресам blog_api/urls.py;
+    2. Число запросов списков не растёт вместе с размером страницы;
+    3. Команда сохраняет результаты в JSON;
+    4. Замер не очищает общий кеш приложения;
+    5. В адреса постов подставляется id поста, в адреса профилей - id профиля.
+    """
+
+    def setUp(self) -> None:
+        get_cache().clear()
+
+    def tearDown(self) -> None:
+        read_buffer.clear()
+
+    def test_all_endpoints(self):
+        user = benchmark.seed(users=5, follows=2, notes=30, reads=20)
+
+        results = benchmark.run(user, repeat=2)
+
+        self.assertEqual({str(pattern.pattern) for pattern in urls.urlpatterns}, set(results))
+        for route, result in results.items():
+            self.assertLess(result['status'], 400, route)
+            self.assertEqual(
+                {'url', 'method', 'status', 'queries', 'p50_ms', 'p95_ms', 'peak_memory_kb'},
+                set(result) - {'queries_by_page_size'},
+            )
+        self.assertIn('queries_by_page_size', results['feed/'])
+        self.assertEqual([], benchmark.growing_endpoints(results))
+
+    def test_command_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+
+            call_command(
+                'benchmark_api', users=3, follows=1, notes=5, reads=5, repeat=2,
+                output=path, check=True, stdout=StringIO(),
+            )
+
+            with open(path) as f:
+                results = json.load(f)
+
+        self.assertIn('notes/', results)
+
+    def test_endpoint_ids(self):
+        user = benchmark.seed(users=3, follows=1, notes=5, reads=5)
+        note_id = Note.objects.order_by('-id').values_list('id', flat=True).first()
+        profile_id = user.profile.id
+        self.assertNotEqual(note_id, profile_id)
+
+        urls_by_route = {endpoint['route']: endpoint['url'] for endpoint in benchmark.get_user_endpoints(user)}
+
+        self.assertEqual(f'/notes/{note_id}/readers/', urls_by_route['notes/<int:pk>/readers/'])
+        self.assertEqual(f'/async/notes/{note_id}/', urls_by_route['async/notes/<int:pk>/'])
+        self.assertEqual(f'/feed/{note_id}/', urls_by_route['feed/<int:pk>/'])
+        self.assertEqual(
+            f'/accounts/profiles/{profile_id}/follows/', urls_by_route['accounts/profiles/<int:pk>/follows/'],
+        )
+
+    def test_shared_cache_kept(self):
+        user = benchmark.seed(users=3, follows=1, notes=5, reads=5)
+        get_cache().set('shared', 1)
+
+        benchmark.run(user, repeat=2)
+
+        self.assertEqual(1, get_cache().get('shared'))
+
+
+# фоновый поток буфера прочтений не должен писать во время других тестов
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=3600)
+class TestLoadTest(LiveServerTestCase):
+    """
+    TESTS:
+    1. Нагрузочное сравнение синхронных и асинхронных адресов через настоящий HTTP-сервер;
+    2. Синтетические данные удаляются после замера;
+    3. Без --url адреса обслуживает локальный ASGI-сервер.
+    """
+
+    def setUp(self) -> None:
+        get_cache().clear()
+
+    def test_load_test(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'load.json')
+
+            call_command(
+                'loadtest_api', users=3, follows=1, notes=5, reads=5, requests=4, concurrency=2,
+                url=self.live_server_url, output=path, stdout=StringIO(),
+            )
+
+            with open(path) as f:
+                results = json.load(f)
+
+        self.assertEqual(self.live_server_url, results['server'])
+        self.assertEqual({sync_route for sync_route, _ in benchmark.LOAD_TEST_PAIRS}, set(results['endpoints']))
+        for route, result in results['endpoints'].items():
+            for mode in ('sync', 'async'):
+                self.assertEqual(0, result[mode]['errors'], (route, mode))
+                self.assertEqual(4, result[mode]['requests'])
+                self.assertEqual(2, result[mode]['concurrency'])
+
+        self.assertFalse(User.objects.filter(username__startswith='bench_0_').exists())
+        self.assertFalse(Note.objects.exists())
+
+    def test_local_asgi_server(self):
+        out = StringIO()
+
+        call_command(
+            'loadtest_api', users=3, follows=1, notes=5, reads=5, requests=4, concurrency=2, stdout=out,
+        )
+
+        results = json.loads(out.getvalue())
+        self.assertEqual('local uvicorn ASGI server', results['server'])
+        for route, result in results['endpoints'].items():
+            for mode in ('sync', 'async'):
+                self.assertEqual(0, result[mode]['errors'], (route, mode))
@@ -0,0 +1,97 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.test import TestCase
+
+from blog_api import feed, search
+from blog_api.models import FeedItem, Note, Profile
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are checked on PostgreSQL only')
+class TestQueryPlans(TestCase):
+    """
+    TESTS:
+    Основные запросы ленты и списков используют индексы, а не последовательное чтение таблиц:
+    1. Лента профиля: страница читается по индексу без сортировки всей ленты,
+       в том числе с авторами с подтягиванием и при переходе по ключу;
+    2. Общий список постов и страница по ключу (create_at, id);
+    3. Посты автора;
+    4. Прочитанные профилем посты и непрочитанная лента;
+    5. Список профилей по числу постов;
+    6. Полнотекстовый поиск по постам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(1, 4):
+            User.objects.create_user(username=f'test_{i}', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2, 3)
+
+        for i in range(30):
+            Note.objects.create(title=f'TEST_title_{i}', note=f'TEST_msg_{i}', user_id=i % 3 + 1)
+        Note.objects.get(pk=1).read_posts.add(1)
+
+    def setUp(self) -> None:
+        # на маленьких таблицах планировщик всегда выбирает Seq Scan,
+        # поэтому запрещаем его: если подходящего индекса нет, Seq Scan останется в плане
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndexes(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'{queryset.query}\n{plan}')
+
+    def assertReadsPageByIndex(self, queryset):
+        """ ORDER BY ... LIMIT обслуживает индекс: в плане нет ни Seq Scan, ни Sort """
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'{queryset.query}\n{plan}')
+        self.assertNotIn('Sort', plan, msg=f'{queryset.query}\n{plan}')
+
+    def test_feed(self):
+        profile = Profile.objects.get(pk=1)
+        queryset = feed.feed_queryset(profile).select_related('user')
+        item = FeedItem.objects.filter(profile=profile).order_by('-create_at', '-note')[5]
+
+        self.assertReadsPageByIndex(queryset[:10])
+        self.assertReadsPageByIndex(
+            queryset.filter(
+                Q(feed_create_at__lt=item.create_at) | Q(feed_create_at=item.create_at, feed_note_id__lt=item.note_id)
+            )[:10]
+        )
+
+    def test_pull_feed(self):
+        Profile.objects.filter(pk__in=[2, 3]).update(is_pull_author=True)
+        merged = feed.feed_queryset(Profile.objects.get(pk=1))
+
+        self.assertIsInstance(merged, feed.MergedQuerySet)
+        # материализованная лента и по запросу на каждого автора с подтягиванием
+        self.assertEqual(3, len(merged.querysets))
+        for queryset in merged.querysets:
+            self.assertReadsPageByIndex(queryset.select_related('user')[:10])
+
+    def test_notes_list(self):
+        note = Note.objects.get(pk=15)
+        queryset = Note.objects.select_related('user').order_by('-create_at', '-id')
+
+        self.assertUsesIndexes(queryset[:10])
+        self.assertUsesIndexes(
+            queryset.filter(Q(create_at__lt=note.create_at) | Q(create_at=note.create_at, id__lt=note.id))[:10]
+        )
+
+    def test_author_notes(self):
+        self.assertUsesIndexes(Note.objects.filter(user_id=2).order_by('-create_at', '-id')[:10])
+
+    def test_read_posts(self):
+        self.assertUsesIndexes(Note.read_posts.through.objects.filter(profile_id=1).values('note_id'))
+
+        read = Note.read_posts.through.objects.filter(note_id=OuterRef('pk'), profile_id=1)
+        profile = Profile.objects.get(pk=1)
+        self.assertUsesIndexes(feed.feed_queryset(profile).filter(~Exists(read))[:10])
+
+    def test_accounts(self):
+        self.assertUsesIndexes(Profile.objects.select_related('user').order_by('-notes_count', 'id')[:10])
+
+    def test_search(self):
+        self.assertUsesIndexes(search.search(Note.objects.all(), 'TEST_msg_1')[:10])
@@ -1,19 +1,51 @@
-from datetime import datetime
-
-from rest_framework.test import APITestCase
+import json
+import time
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework.test import APITestCase, APIRequestFactory
 from rest_framework import status
+from rest_framework.request import Request
 from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db import connection, DatabaseError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from blog_api import feed, serializers
+from blog_api.async_views import AsyncNoteListView, AsyncFeedView, AsyncNoteDetailView
+from blog_api.authentication import make_token
+from blog_api.models import Note, Profile, FeedItem
+from blog_api.pagination import ProfileCursorPagination
+from blog_api.reads import read_buffer, is_read_by
+from blog_api.cache import get_cache
+
+
+# фоновый поток буфера прочтений не должен записывать прочтения посреди других тестов
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=3600)
+class BlogAPITestCase(APITestCase):
+    """ Кеш и буфер прочтений не откатываются вместе с базой, поэтому очищаем их перед каждым тестом """
 
-from blog_api.models import Note
+    def _pre_setup(self):
+        super()._pre_setup()
+        get_cache().clear()
+        read_buffer.clear()
 
+    def _post_teardown(self):
+        read_buffer.clear()
+        super()._post_teardown()
 
-class TestNoteAPIView(APITestCase):
+
+class TestNoteAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение пустого списка записей в блоге;
     2. Получение списка записей в блоге;
     3. Создание записи в блоге;
-    4. Сортировка по дате создания поста (сначала свежие).
+    4. Сортировка по дате создания поста (сначала свежие);
+    5. Сбой при обновлении счётчика откатывает пост и его строки в лентах.
     """
     maxDiff = None
 
@@ -73,7 +105,8 @@ class TestNoteAPIView(APITestCase):
                     "note": "Test",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_1",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 }
             ]
         }
@@ -106,7 +139,8 @@ class TestNoteAPIView(APITestCase):
             "note": "test_message",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 0
+            "views": 0,
+            "is_read": False
         }
 
         self.assertTrue(Note.objects.get(pk=1))
@@ -136,7 +170,8 @@ class TestNoteAPIView(APITestCase):
                     "note": "Test_2",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_1",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 },
                 {
                     "id": note_1.id,
@@ -144,15 +179,26 @@ class TestNoteAPIView(APITestCase):
                     "note": "Test_1",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_1",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 }
             ]
         }
 
         self.assertDictEqual(expected_data, resp.data)
 
+    def test_create_rollback(self):
+        with mock.patch('blog_api.counters.add_profile_counts', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/notes/', data={'title': 'test_title', 'note': 'test_message'})
+
+        self.assertFalse(Note.objects.exists())
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(0, Profile.objects.get(pk=1).notes_count)
 
-class TestNoteDetailAPIView(APITestCase):
+
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=0)
+class TestNoteDetailAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение существующей записи в блоге;
@@ -200,7 +246,8 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 1
+            "views": 1,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
@@ -240,7 +287,8 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg_PUT",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 1
+            "views": 1,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
@@ -283,7 +331,8 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg_2",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 1
+            "views": 1,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
@@ -307,7 +356,8 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg_patch",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 1
+            "views": 1,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
@@ -340,7 +390,8 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg_3",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_2",
-            "views": 1
+            "views": 1,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
@@ -375,13 +426,14 @@ class TestNoteDetailAPIView(APITestCase):
             "note": "TEST_msg",
             "create_at": f"{self.get_date_create_at()}",
             "user": "test_1",
-            "views": 2
+            "views": 2,
+            "is_read": True
         }
 
         self.assertDictEqual(expected_data, resp.data)
 
 
-class TestCreateUserView(APITestCase):
+class TestCreateUserView(BlogAPITestCase):
     """
     TESTS:
     1. Регистрация пользователя.
@@ -407,7 +459,7 @@ class TestCreateUserView(APITestCase):
         self.assertTrue(resp_2)
 
 
-class TestAccountsAPIView(APITestCase):
+class TestAccountsAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение пустого списка пользователей;
@@ -489,7 +541,7 @@ class TestAccountsAPIView(APITestCase):
         self.assertDictEqual(expected_data, response_data)
 
 
-class TestAccountDetailAPIView(APITestCase):
+class TestAccountDetailAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение существующего пользователя;
@@ -570,7 +622,7 @@ class TestAccountDetailAPIView(APITestCase):
         self.assertDictEqual(put_data, resp.data)
 
 
-class TestAccountFollowsAPIView(APITestCase):
+class TestAccountFollowsAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение подписок пользователя;
@@ -625,7 +677,8 @@ class TestAccountFollowsAPIView(APITestCase):
         self.assertDictEqual(expected_data, resp.data)
 
 
-class TestFeedAPIView(APITestCase):
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=0)
+class TestFeedAPIView(BlogAPITestCase):
     """
     TESTS:
     1. Получение ленты постов;
@@ -690,7 +743,8 @@ class TestFeedAPIView(APITestCase):
                     "note": "TEST_msg_4",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_user_3",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 },
                 {
                     "id": 2,
@@ -698,7 +752,8 @@ class TestFeedAPIView(APITestCase):
                     "note": "TEST_msg_2",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_user_2",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 },
                 {
                     "id": 1,
@@ -706,7 +761,8 @@ class TestFeedAPIView(APITestCase):
                     "note": "TEST_msg_1",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_user_3",
-                    "views": 0
+                    "views": 0,
+                    "is_read": False
                 },
             ]
         }
@@ -736,7 +792,8 @@ class TestFeedAPIView(APITestCase):
                     "note": "TEST_msg_4",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_user_3",
-                    "views": 1
+                    "views": 1,
+                    "is_read": True
                 },
                 {
                     "id": 2,
@@ -744,8 +801,1550 @@ class TestFeedAPIView(APITestCase):
                     "note": "TEST_msg_2",
                     "create_at": f"{self.get_date_create_at()}",
                     "user": "test_user_2",
-                    "views": 1
+                    "views": 1,
+                    "is_read": True
                 },
             ]
         }
         self.assertEqual(expected_data, resp.data)
+
+
+class TestFeedFanOut(BlogAPITestCase):
+    """
+    TESTS:
+    1. Новый пост попадает в материализованную ленту подписчика;
+    2. Отписка убирает посты автора из ленты;
+    3. Посты автора с большим числом подписчиков подтягиваются при чтении ленты;
+    4. Лента с такими авторами постранично (по номеру и по ключу) совпадает с полной лентой без повторов;
+    5. Посты нескольких авторов с подтягиванием читаются отдельными запросами и сливаются по времени.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_user', password='1234567')
+        User.objects.create_user(username='test_user_2', password='1234567')
+
+        Profile.objects.get(pk=1).follows.add(2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_user', password='1234567')
+
+    def get_feed_ids(self):
+        resp = self.client.get('/feed/')
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+
+        return [item['id'] for item in resp.data['results']]
+
+    def test_fan_out_on_create(self):
+        note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+        self.assertTrue(FeedItem.objects.filter(profile_id=1, note=note).exists())
+        self.assertEqual([note.id], self.get_feed_ids())
+
+    def test_unfollow(self):
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+        Profile.objects.get(pk=1).follows.remove(2)
+
+        self.assertFalse(FeedItem.objects.filter(profile_id=1).exists())
+        self.assertEqual([], self.get_feed_ids())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_pull_author(self):
+        note_1 = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+        note_2 = Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=2)
+
+        self.assertTrue(Profile.objects.get(pk=2).is_pull_author)
+        self.assertFalse(FeedItem.objects.filter(note=note_2).exists())
+        self.assertEqual([note_2.id, note_1.id], self.get_feed_ids())
+
+    def test_pull_author_pages(self):
+        # пост, разложенный по лентам до того, как автор стал подтягиваемым, не должен повториться
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=1):
+            for i in range(12):
+                Note.objects.create(title=f'TEST_title_{i}', note='TEST_msg', user_id=i % 2 + 1)
+        expected = list(feed.feed_notes(Profile.objects.get(pk=1)).values_list('id', flat=True))
+        self.assertEqual(13, len(expected))
+
+        resp = self.client.get('/feed/')
+        resp_2 = self.client.get('/feed/?page=2')
+        self.assertEqual(13, resp.data['count'])
+        self.assertEqual(expected, [item['id'] for item in resp.data['results'] + resp_2.data['results']])
+
+        resp = self.client.get('/feed/?pagination=cursor')
+        resp_2 = self.client.get(resp.data['next'])
+        self.assertEqual(expected, [item['id'] for item in resp.data['results'] + resp_2.data['results']])
+        resp_prev = self.client.get(resp_2.data['previous'])
+        self.assertEqual(expected[:10], [item['id'] for item in resp_prev.data['results']])
+
+        resp = self.client.get('/feed/?unread=true&pagination=cursor')
+        self.assertEqual(expected[:10], [item['id'] for item in resp.data['results']])
+
+    def test_pull_authors(self):
+        User.objects.create_user(username='test_user_3', password='1234567')
+        profile = Profile.objects.get(pk=1)
+        profile.follows.add(3)
+        Profile.objects.filter(pk__in=[2, 3]).update(is_pull_author=True)
+        for i in range(15):
+            Note.objects.create(title=f'TEST_title_{i}', note='TEST_msg', user_id=i % 3 + 1)
+
+        merged = feed.feed_queryset(profile)
+        self.assertEqual(3, len(merged.querysets))
+        expected = list(feed.feed_notes(profile).values_list('id', flat=True))
+        self.assertEqual(list(reversed(range(1, 16))), expected)
+
+        resp = self.client.get('/feed/?pagination=cursor')
+        resp_2 = self.client.get(resp.data['next'])
+        self.assertEqual(expected, [item['id'] for item in resp.data['results'] + resp_2.data['results']])
+
+
+class TestKeysetPagination(BlogAPITestCase):
+    """
+    TESTS:
+    1. Постраничный вывод по ключу без count;
+    2. Переход на следующую и предыдущую страницу;
+    3. Старый постраничный вывод по номеру страницы продолжает работать.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        cls.notes = [
+            Note.objects.create(title=f'Test_{i}', note=f'Test_{i}', user_id=1)
+            for i in range(12)
+        ]
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_cursor_pages(self):
+        expected_ids = [note.id for note in reversed(self.notes)]
+
+        for url in ['/notes/?pagination=cursor', '/feed/?pagination=cursor']:
+            resp = self.client.get(url)
+
+            self.assertEqual(status.HTTP_200_OK, resp.status_code)
+            self.assertNotIn('count', resp.data)
+            self.assertIsNone(resp.data['previous'])
+            self.assertEqual(expected_ids[:10], [item['id'] for item in resp.data['results']])
+
+            resp_2 = self.client.get(resp.data['next'])
+
+            self.assertIsNone(resp_2.data['next'])
+            self.assertEqual(expected_ids[10:], [item['id'] for item in resp_2.data['results']])
+
+            resp_3 = self.client.get(resp_2.data['previous'])
+
+            self.assertEqual(expected_ids[:10], [item['id'] for item in resp_3.data['results']])
+            self.assertIsNone(resp_3.data['previous'])
+
+    def test_cursor_header(self):
+        resp = self.client.get('/notes/', HTTP_X_PAGINATION='cursor')
+
+        self.assertNotIn('count', resp.data)
+        self.assertEqual(10, len(resp.data['results']))
+
+    def test_invalid_cursor(self):
+        resp = self.client.get('/notes/?cursor=broken')
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, resp.status_code)
+
+    def test_page_number(self):
+        resp = self.client.get('/notes/?page=2')
+
+        self.assertEqual(12, resp.data['count'])
+        self.assertEqual(2, len(resp.data['results']))
+
+
+class TestNoteViewsCounter(BlogAPITestCase):
+    """
+    TESTS:
+    1. Счётчик просмотров увеличивается при прочтении и не растёт при повторном;
+    2. Счётчик уменьшается при удалении прочтения;
+    3. Пересчёт счётчика по таблице read_posts;
+    4. Сериализация ленты не загружает прочитавших.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        cls.note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_add_and_remove(self):
+        self.note.read_posts.add(1, 2)
+        self.note.read_posts.add(1)
+        self.assertEqual(2, Note.objects.get(pk=self.note.pk).views)
+
+        Profile.objects.get(pk=2).note_set.remove(self.note)
+        self.assertEqual(1, Note.objects.get(pk=self.note.pk).views)
+
+        self.note.read_posts.clear()
+        self.assertEqual(0, Note.objects.get(pk=self.note.pk).views)
+
+    def test_rebuild(self):
+        self.note.read_posts.add(1, 2)
+        Note.objects.update(views=100)
+
+        call_command('rebuild_note_views', stdout=StringIO())
+
+        self.assertEqual(2, Note.objects.get(pk=self.note.pk).views)
+
+    def test_feed_without_read_posts_query(self):
+        self.note.read_posts.add(1, 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/feed/')
+
+        self.assertEqual(2, resp.data['results'][0]['views'])
+        # read_posts используется только в EXISTS для is_read: профили прочитавших не загружаются
+        self.assertFalse([q for q in ctx.captured_queries if 'JOIN "blog_api_note_read_posts"' in q['sql']])
+
+
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=3600)
+class TestReadReceipts(BlogAPITestCase):
+    """
+    TESTS:
+    1. Открытие поста не пишет в базу, прочтение попадает в буфер;
+    2. Сброс буфера записывает прочтения пачкой и обновляет счётчик;
+    3. Повторные прочтения не дублируются;
+    4. Прочтение удалённого поста не откатывает остальные прочтения пачки;
+    5. При ошибке записи прочтения остаются в буфере.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        cls.note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_buffered_read(self):
+        url = f'/notes/{self.note.pk}/'
+
+        resp = self.client.get(url)
+
+        self.assertEqual(0, resp.data['views'])
+        self.assertFalse(self.note.read_posts.exists())
+
+        self.client.get(url)
+        self.client.login(username='test_2', password='1234567')
+        self.client.get(url)
+
+        self.assertEqual(2, read_buffer.flush())
+        self.assertEqual(2, Note.objects.get(pk=self.note.pk).views)
+        self.assertEqual({1, 2}, set(self.note.read_posts.values_list('id', flat=True)))
+
+    def test_duplicate_read(self):
+        self.note.read_posts.add(1)
+
+        self.client.get(f'/notes/{self.note.pk}/')
+        read_buffer.flush()
+
+        self.assertEqual(1, Note.objects.get(pk=self.note.pk).views)
+
+    def test_deleted_note(self):
+        deleted = Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=1)
+        self.client.get(f'/notes/{self.note.pk}/')
+        self.client.get(f'/notes/{deleted.pk}/')
+        deleted.delete()
+
+        self.assertEqual(1, read_buffer.flush())
+        self.assertEqual([1], list(self.note.read_posts.values_list('id', flat=True)))
+        self.assertFalse(Note.read_posts.through.objects.filter(note_id=deleted.pk).exists())
+
+    def test_failed_flush(self):
+        self.client.get(f'/notes/{self.note.pk}/')
+
+        with mock.patch.object(Note.read_posts.through.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                read_buffer.flush()
+
+        self.assertEqual(1, read_buffer.flush())
+        self.assertTrue(self.note.read_posts.filter(pk=1).exists())
+
+
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=3600)
+class TestResponseCache(BlogAPITestCase):
+    """
+    TESTS:
+    1. Повторный запрос поста отдаётся из кеша без чтения постов (остаются только запросы для ETag);
+    2. Изменение поста сбрасывает кеш;
+    3. Новый пост автора сбрасывает кешированную ленту подписчика;
+    4. Подписка сбрасывает кеш профиля;
+    5. Статистика попаданий и промахов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_superuser(username='admin', password='1234567')
+        cls.note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_note_cache(self):
+        url = f'/notes/{self.note.pk}/'
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+
+        self.assertEqual('TEST_title', resp.data['title'])
+        self.assertFalse([q for q in ctx.captured_queries if '"blog_api_note"."title"' in q['sql']])
+
+        self.client.patch(url, {'title': 'TEST_title_patch'})
+        resp = self.client.get(url)
+
+        self.assertEqual('TEST_title_patch', resp.data['title'])
+
+    def test_feed_cache(self):
+        resp = self.client.get('/feed/')
+        self.assertEqual(1, resp.data['count'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp_2 = self.client.get('/feed/')
+
+        self.assertEqual(resp.data, resp_2.data)
+        self.assertFalse([q for q in ctx.captured_queries if '"blog_api_note"."title"' in q['sql']])
+
+        Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=1)
+        resp_3 = self.client.get('/feed/')
+
+        self.assertEqual(2, resp_3.data['count'])
+
+    def test_profile_cache(self):
+        url = '/accounts/profiles/1/'
+        self.client.get(url)
+
+        Profile.objects.get(pk=1).follows.add(2)
+        resp = self.client.get(url)
+
+        self.assertEqual(2, resp.data['follow_count'])
+
+    def test_stats(self):
+        self.client.get(f'/notes/{self.note.pk}/')
+        self.client.get(f'/notes/{self.note.pk}/')
+
+        self.client.login(username='admin', password='1234567')
+        resp = self.client.get('/cache/stats/')
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual({'hits': 1, 'misses': 1}, resp.data['note'])
+
+
+class TestNoteDateFormat(BlogAPITestCase):
+    """
+    TESTS:
+    1. Дата без микросекунд форматируется без ошибок;
+    2. Формат даты ISO 8601 по параметру запроса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+        Note.objects.filter(pk=note.pk).update(create_at=datetime(2022, 8, 21, 16, 14, tzinfo=timezone.utc))
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_without_microseconds(self):
+        resp = self.client.get('/notes/')
+
+        self.assertEqual('21 August 2022 - 16:14', resp.data['results'][0]['create_at'])
+
+    def test_iso_format(self):
+        resp = self.client.get('/notes/?date_format=iso')
+
+        self.assertEqual('2022-08-21T16:14:00Z', resp.data['results'][0]['create_at'])
+
+        resp_2 = self.client.get('/notes/1/?date_format=iso')
+
+        self.assertEqual('2022-08-21T16:14:00Z', resp_2.data['create_at'])
+
+
+class TestAccountCountsQueries(BlogAPITestCase):
+    """
+    TESTS:
+    1. Число запросов списка профилей не зависит от числа профилей;
+    2. Тексты постов не загружаются для подсчёта;
+    3. Детальный профиль считает подписки и посты в том же запросе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertFalse([q for q in ctx.captured_queries if '"blog_api_note"."note"' in q['sql']])
+        return len(ctx.captured_queries)
+
+    def test_constant_queries(self):
+        queries = self.count_queries('/accounts/profiles/')
+
+        for i in range(2, 7):
+            User.objects.create_user(username=f'test_{i}', password='1234567')
+            Note.objects.create(title='TEST_title', note='TEST_msg', user_id=i)
+
+        self.assertEqual(queries, self.count_queries('/accounts/profiles/'))
+
+    def test_detail_counts(self):
+        Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=1)
+
+        self.count_queries('/accounts/profiles/1/')
+        resp = self.client.get('/accounts/profiles/1/')
+
+        self.assertEqual(1, resp.data['follow_count'])
+        self.assertEqual(2, resp.data['notes_count'])
+
+
+class TestProfileCounters(BlogAPITestCase):
+    """
+    TESTS:
+    1. Счётчик постов меняется при создании и удалении поста;
+    2. Счётчики подписок и подписчиков меняются при подписке и отписке;
+    3. Сохранение профиля не перезаписывает счётчики;
+    4. Пересчёт счётчиков командой.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+
+    def get_counts(self, pk):
+        return Profile.objects.values_list('notes_count', 'follows_count', 'followers_count').get(pk=pk)
+
+    def test_notes_count(self):
+        note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+        Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=1)
+        self.assertEqual((2, 1, 1), self.get_counts(1))
+
+        note.delete()
+        self.assertEqual((1, 1, 1), self.get_counts(1))
+
+    def test_follow_counts(self):
+        profile = Profile.objects.get(pk=1)
+
+        profile.follows.add(2)
+        profile.follows.add(2)
+        self.assertEqual((0, 2, 1), self.get_counts(1))
+        self.assertEqual((0, 1, 2), self.get_counts(2))
+
+        profile.save()
+        self.assertEqual((0, 2, 1), self.get_counts(1))
+
+        profile.follows.remove(2)
+        self.assertEqual((0, 1, 1), self.get_counts(1))
+        self.assertEqual((0, 1, 1), self.get_counts(2))
+
+        Profile.objects.get(pk=2).followed_by.clear()
+        self.assertEqual((0, 1, 1), self.get_counts(1))
+        self.assertEqual((0, 0, 0), self.get_counts(2))
+
+    def test_rebuild(self):
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+        Profile.objects.update(notes_count=10, follows_count=10, followers_count=10)
+
+        call_command('rebuild_profile_counts', batch_size=1, stdout=StringIO())
+
+        self.assertEqual((0, 1, 1), self.get_counts(1))
+        self.assertEqual((1, 1, 1), self.get_counts(2))
+
+
+@override_settings(READ_RECEIPTS_FLUSH_INTERVAL=0)
+class TestFeedUnreadFilter(BlogAPITestCase):
+    """
+    TESTS:
+    1. Непрочитанные посты ленты;
+    2. Прочитанные посты ленты;
+    3. Фильтр совместим с постраничным выводом по ключу.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_user', password='1234567')
+        User.objects.create_user(username='test_user_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+
+        cls.notes = [
+            Note.objects.create(title=f'TEST_title_{i}', note=f'TEST_msg_{i}', user_id=2)
+            for i in range(4)
+        ]
+        # прочтения других пользователей не влияют на фильтр
+        cls.notes[0].read_posts.add(1, 2)
+        cls.notes[2].read_posts.add(1)
+        cls.notes[3].read_posts.add(2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_user', password='1234567')
+
+    def get_ids(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+
+        return [item['id'] for item in resp.data['results']]
+
+    def test_unread(self):
+        self.assertEqual([self.notes[3].id, self.notes[1].id], self.get_ids('/feed/?unread=true'))
+
+    def test_read(self):
+        self.assertEqual([self.notes[2].id, self.notes[0].id], self.get_ids('/feed/?unread=false'))
+
+    def test_unread_after_reading(self):
+        self.client.get(f'/feed/{self.notes[3].id}/')
+
+        self.assertEqual([self.notes[1].id], self.get_ids('/feed/?unread=true'))
+
+    def test_with_cursor(self):
+        self.assertEqual(
+            [self.notes[3].id, self.notes[1].id],
+            self.get_ids('/feed/?unread=true&pagination=cursor'),
+        )
+
+
+class TestNoteReadState(BlogAPITestCase):
+    """
+    TESTS:
+    1. Отметка is_read в ленте и списке постов для текущего пользователя;
+    2. Отметка is_read в закешированной ленте;
+    3. Постраничный список прочитавших пост.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        cls.note_1 = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=1)
+        cls.note_2 = Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=1)
+        cls.note_1.read_posts.add(1)
+        cls.note_2.read_posts.add(2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def get_read_state(self, url):
+        resp = self.client.get(url)
+        return {item['id']: item['is_read'] for item in resp.data['results']}
+
+    def test_is_read(self):
+        expected = {self.note_1.id: True, self.note_2.id: False}
+
+        self.assertEqual(expected, self.get_read_state('/notes/'))
+        self.assertEqual(expected, self.get_read_state('/feed/'))
+        # повторный запрос отдаётся из кеша
+        self.assertEqual(expected, self.get_read_state('/feed/'))
+
+        self.client.login(username='test_2', password='1234567')
+
+        self.assertEqual({self.note_1.id: False, self.note_2.id: True}, self.get_read_state('/notes/'))
+
+    def test_readers(self):
+        self.note_1.read_posts.add(2)
+
+        resp = self.client.get(f'/notes/{self.note_1.id}/readers/')
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual([{'user': 'test_1'}, {'user': 'test_2'}], resp.data['results'])
+        self.assertIsNone(resp.data['next'])
+
+    def test_readers_not_found(self):
+        resp = self.client.get('/notes/100/readers/')
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, resp.status_code)
+
+
+class TestBulkEndpoints(BlogAPITestCase):
+    """
+    TESTS:
+    1. Пакетное создание постов с результатом по каждому элементу;
+    2. Созданные пакетом посты попадают в ленты и счётчики;
+    3. Ограничение размера пакета;
+    4. Пакетная отметка прочитанными.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=2).follows.add(1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_bulk_create(self):
+        data = {'notes': [
+            {'title': 'TEST_title_1', 'note': 'TEST_msg_1'},
+            {'title': '', 'note': 'TEST_msg_2'},
+            {'title': 'TEST_title_3', 'note': 'TEST_msg_3'},
+        ]}
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/notes/bulk/', data, format='json')
+
+        self.assertEqual(status.HTTP_207_MULTI_STATUS, resp.status_code)
+        self.assertEqual([201, 400, 201], [item['status'] for item in resp.data['results']])
+        self.assertIn('title', resp.data['results'][1]['errors'])
+        self.assertEqual('TEST_title_3', resp.data['results'][2]['note']['title'])
+        self.assertEqual(1, len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "blog_api_note"')]))
+
+        self.assertEqual(2, Profile.objects.get(pk=1).notes_count)
+        self.assertEqual(2, FeedItem.objects.filter(profile_id=2).count())
+
+    def test_batch_size(self):
+        data = {'notes': [{'title': 'TEST_title', 'note': 'TEST_msg'}] * 3}
+
+        with override_settings(BULK_MAX_BATCH_SIZE=2):
+            resp = self.client.post('/notes/bulk/', data, format='json')
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+        self.assertFalse(Note.objects.exists())
+
+    def test_bulk_read(self):
+        note_1 = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+        note_2 = Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=2)
+        note_1.read_posts.add(1)
+
+        resp = self.client.post('/notes/read/', {'ids': [note_1.id, note_2.id, 100]}, format='json')
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(
+            [{'id': note_1.id, 'status': 200}, {'id': note_2.id, 'status': 200}, {'id': 100, 'status': 404}],
+            resp.data['results'],
+        )
+        self.assertEqual([1, 1], list(Note.objects.order_by('id').values_list('views', flat=True)))
+
+
+class TestAccountFollowAPIView(BlogAPITestCase):
+    """
+    TESTS:
+    1. Подписка добавляет одну строку связи, повторная подписка ничего не меняет;
+    2. Подписка дополняет ленту и счётчики;
+    3. Отписка убирает посты автора из ленты, повторная отписка ничего не меняет;
+    4. Подписка на несуществующий профиль.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def get_counts(self, pk):
+        return Profile.objects.values_list('follows_count', 'followers_count').get(pk=pk)
+
+    def test_follow(self):
+        resp = self.client.post('/accounts/profiles/2/follow/')
+        self.assertEqual(status.HTTP_201_CREATED, resp.status_code)
+        self.assertEqual({'follows': 2}, resp.data)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/accounts/profiles/2/follow/')
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+        self.assertEqual([1, 2], list(Profile.objects.get(pk=1).follows.order_by('id').values_list('id', flat=True)))
+        self.assertEqual((2, 1), self.get_counts(1))
+        self.assertEqual((1, 2), self.get_counts(2))
+        self.assertEqual(1, FeedItem.objects.filter(profile_id=1).count())
+
+    def test_unfollow(self):
+        Profile.objects.get(pk=1).follows.add(2)
+
+        resp = self.client.delete('/accounts/profiles/2/follow/')
+        self.assertEqual(status.HTTP_204_NO_CONTENT, resp.status_code)
+        self.assertEqual((1, 1), self.get_counts(1))
+        self.assertEqual((1, 1), self.get_counts(2))
+        self.assertFalse(FeedItem.objects.filter(profile_id=1).exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.delete('/accounts/profiles/2/follow/')
+        self.assertEqual(status.HTTP_204_NO_CONTENT, resp.status_code)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+    def test_not_found(self):
+        resp = self.client.post('/accounts/profiles/100/follow/')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, resp.status_code)
+
+
+class TestAccountFollowLists(BlogAPITestCase):
+    """
+    TESTS:
+    1. Постраничный список подписок профиля;
+    2. Постраничный список подписчиков профиля;
+    3. Число запросов не зависит от размера списка, читаются только id и username;
+    4. Несуществующий профиль.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(1, 5):
+            User.objects.create_user(username=f'test_{i}', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2, 3, 4)
+        Profile.objects.get(pk=2).follows.add(1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_following(self):
+        resp = self.client.get('/accounts/profiles/1/following/')
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(
+            [{'user': 'test_1'}, {'user': 'test_2'}, {'user': 'test_3'}, {'user': 'test_4'}],
+            resp.data['results'],
+        )
+        self.assertIsNone(resp.data['next'])
+
+    def test_followers(self):
+        resp = self.client.get('/accounts/profiles/1/followers/')
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual([{'user': 'test_1'}, {'user': 'test_2'}], resp.data['results'])
+
+    def test_cursor(self):
+        with mock.patch.object(ProfileCursorPagination, 'page_size', 3):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get('/accounts/profiles/1/following/')
+            # сессия, пользователь, профиль из адреса и сама страница
+            self.assertEqual(4, len(ctx.captured_queries))
+            self.assertNotIn('"first_name"', ctx.captured_queries[-1]['sql'])
+            self.assertEqual(3, len(resp.data['results']))
+            self.assertIsNotNone(resp.data['next'])
+
+            resp = self.client.get(resp.data['next'])
+
+        self.assertEqual([{'user': 'test_4'}], resp.data['results'])
+
+    def test_not_found(self):
+        resp = self.client.get('/accounts/profiles/100/followers/')
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, resp.status_code)
+
+
+class TestNoteValuesSerializer(BlogAPITestCase):
+    """
+    TESTS:
+    1. Списки постов совпадают с выводом NoteSerializer;
+    2. Формат даты из запроса учитывается;
+    3. Страница ленты из кеша совпадает с исходной.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        for i in range(3):
+            Note.objects.create(title=f'TEST_title_{i}', note=f'TEST_msg_{i}', user_id=i % 2 + 1)
+        Note.objects.get(pk=2).read_posts.add(1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def get_expected(self, queryset, query=''):
+        request = Request(APIRequestFactory().get(f'/notes/{query}'))
+        notes = queryset.select_related('user').annotate(is_read=is_read_by(1))
+        return serializers.NoteSerializer(notes, many=True, context={'request': request}).data
+
+    def test_notes(self):
+        for query in ('', '?date_format=iso', '?pagination=cursor'):
+            with self.subTest(query=query):
+                resp = self.client.get(f'/notes/{query}')
+                expected = self.get_expected(Note.objects.order_by('-create_at', '-id'), query)
+
+                self.assertEqual(expected, resp.data['results'])
+
+    def test_feed(self):
+        resp = self.client.get('/feed/')
+        expected = self.get_expected(feed.feed_queryset(Profile.objects.get(pk=1)))
+
+        self.assertEqual(expected, resp.data['results'])
+        self.assertEqual(['TEST_title_2', 'TEST_title_1', 'TEST_title_0'], [item['title'] for item in resp.data['results']])
+
+    def test_cached_feed(self):
+        self.client.get('/feed/')
+        # повторный запрос собирается из кеша постов
+        resp = self.client.get('/feed/')
+
+        expected = self.get_expected(feed.feed_queryset(Profile.objects.get(pk=1)))
+        self.assertEqual(expected, resp.data['results'])
+
+
+class TestNoteExcerpt(BlogAPITestCase):
+    """
+    TESTS:
+    1. ?excerpt=N в списках отдаёт первые N символов текста и не читает полный текст из базы;
+    2. Отдельный пост отдаётся с полным текстом;
+    3. Некорректное значение excerpt.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        Note.objects.create(title='TEST_title', note='TEST_msg ' * 100, user_id=2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_excerpt(self):
+        for url in ['/notes/?excerpt=8', '/feed/?excerpt=8', '/notes/?excerpt=8&pagination=cursor']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    resp = self.client.get(url)
+
+                self.assertEqual(status.HTTP_200_OK, resp.status_code)
+                self.assertEqual('TEST_msg', resp.data['results'][0]['note'])
+                self.assertEqual('TEST_title', resp.data['results'][0]['title'])
+                sql = ctx.captured_queries[-1]['sql']
+                # текст поста читается только внутри SUBSTR
+                self.assertRegex(sql, r'SUBSTR\("blog_api_note"\."note", 1, 8\)')
+                self.assertNotRegex(sql, r'(?<!SUBSTR\()"blog_api_note"\."note"')
+
+    def test_detail(self):
+        self.client.get('/notes/?excerpt=8')
+        resp = self.client.get('/notes/1/')
+
+        self.assertEqual('TEST_msg ' * 100, resp.data['note'])
+
+    def test_invalid(self):
+        for value in ['0', '-1', 'abc']:
+            with self.subTest(value=value):
+                resp = self.client.get(f'/notes/?excerpt={value}')
+
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+                self.assertIn('excerpt', resp.data)
+
+
+class TestSparseFields(BlogAPITestCase):
+    """
+    TESTS:
+    1. ?fields оставляет в ответе только перечисленные поля, ?exclude - убирает перечисленные;
+    2. Запросы к базе сокращаются вместе с ответом;
+    3. Неизвестные поля;
+    4. Запись не зависит от ?fields.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        return resp, ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_note_lists(self):
+        for url in ['/notes/', '/feed/', '/notes/?pagination=cursor']:
+            with self.subTest(url=url):
+                resp, sql = self.get(f'{url}{"&" if "?" in url else "?"}fields=id,title')
+
+                self.assertEqual([{'id': 1, 'title': 'TEST_title'}], resp.data['results'])
+                self.assertNotIn('JOIN "auth_user"', sql)
+                self.assertNotIn('"blog_api_note_read_posts"', sql)
+                self.assertNotIn('"blog_api_note"."note"', sql)
+
+        resp, _ = self.get('/notes/?exclude=note,views,is_read')
+        self.assertEqual(['id', 'title', 'create_at', 'user'], list(resp.data['results'][0]))
+
+    def test_note_detail(self):
+        resp, sql = self.get('/notes/1/?fields=title')
+
+        self.assertEqual({'title': 'TEST_title'}, resp.data)
+        self.assertNotIn('JOIN "auth_user"', sql)
+        self.assertNotIn('"blog_api_note"."note"', sql)
+
+    def test_accounts(self):
+        resp, sql = self.get('/accounts/profiles/1/?fields=user')
+        self.assertEqual({'user': 'test_1'}, resp.data)
+        self.assertNotIn('"blog_api_profile_follows"', sql)
+
+        resp, sql = self.get('/accounts/profiles/1/?exclude=user,first_name,last_name,email')
+        self.assertEqual(['follow_count', 'notes_count', 'follows'], list(resp.data))
+        self.assertNotIn('JOIN "auth_user"', sql)
+
+        resp, sql = self.get('/accounts/profiles/?fields=notes_count')
+        self.assertEqual([{'notes_count': 1}, {'notes_count': 0}], resp.data['results'])
+        self.assertNotIn('INNER JOIN "auth_user"', sql)
+
+        resp, sql = self.get('/accounts/profiles/1/follows/?fields=user')
+        self.assertEqual({'user': 'test_1'}, resp.data)
+        self.assertNotIn('"blog_api_profile_follows"', sql)
+
+    def test_unknown_fields(self):
+        resp = self.client.get('/notes/?fields=id,password')
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+        self.assertEqual(['Unknown fields: password.'], resp.data['fields'])
+
+    def test_write(self):
+        self.client.login(username='test_2', password='1234567')
+
+        resp = self.client.patch('/notes/1/?fields=id', data={'title': 'TEST_title_2'})
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual('TEST_title_2', resp.data['title'])
+
+
+# период ETag ленты, чтобы граница периода не попала внутрь теста
+@override_settings(BLOG_CACHE_FEED_TIMEOUT=3600)
+class TestConditionalGet(BlogAPITestCase):
+    """
+    TESTS:
+    1. Пост: ETag и Last-Modified, 304 на If-None-Match и If-Modified-Since без сериализации;
+    2. Изменение поста меняет ETag;
+    3. Лента: 304 до новой публикации в подписках;
+    4. Профиль: 304 до изменения профиля;
+    5. ETag зависит от параметров запроса;
+    6. Ответ 304 на пост тоже отмечает его прочитанным;
+    7. Last-Modified ленты меняется при подписке, отписке и прочтении;
+    8. Last-Modified поста меняется вместе с числом просмотров.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        cls.note = Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def test_note(self):
+        url = f'/notes/{self.note.pk}/'
+        resp = self.client.get(url)
+        etag = resp['ETag']
+
+        self.assertTrue(resp.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+        self.assertEqual(b'', resp.content)
+        self.assertFalse([q for q in ctx.captured_queries if '"blog_api_note"."title"' in q['sql']])
+
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        self.client.login(username='test_2', password='1234567')
+        self.client.patch(url, {'title': 'TEST_title_patch'})
+        self.client.login(username='test_1', password='1234567')
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual('TEST_title_patch', resp.data['title'])
+
+    def test_feed(self):
+        resp = self.client.get('/feed/')
+        etag = resp['ETag']
+
+        resp = self.client.get('/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=2)
+
+        resp = self.client.get('/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(2, resp.data['count'])
+
+    def test_profile(self):
+        url = '/accounts/profiles/1/'
+        etag = self.client.get(url)['ETag']
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        self.client.delete('/accounts/profiles/2/follow/')
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(1, resp.data['follow_count'])
+
+    def test_query_params(self):
+        etag = self.client.get('/feed/')['ETag']
+
+        resp = self.client.get('/feed/?date_format=iso', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertNotEqual(etag, resp['ETag'])
+
+    def test_not_modified_read(self):
+        url = f'/notes/{self.note.pk}/'
+        # ETag поста не зависит от читателя: его мог получить другой пользователь или общий прокси
+        self.client.login(username='test_2', password='1234567')
+        etag = self.client.get(url)['ETag']
+        self.client.login(username='test_1', password='1234567')
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        read_buffer.flush()
+        self.assertTrue(self.note.read_posts.filter(pk=1).exists())
+
+    @staticmethod
+    def later(seconds):
+        """ Изменения позже полученного Last-Modified: его точность - секунда """
+        return mock.patch('blog_api.cache.time', **{'time.return_value': time.time() + seconds})
+
+    def test_feed_if_modified_since(self):
+        User.objects.create_user(username='test_3', password='1234567')
+        Note.objects.create(title='TEST_title_2', note='TEST_msg_2', user_id=3)
+        last_modified = self.client.get('/feed/')['Last-Modified']
+        profile = Profile.objects.get(pk=1)
+
+        changes = [
+            ('follow', lambda: profile.follows.add(3), 2),
+            ('unfollow', lambda: profile.follows.remove(3), 1),
+            ('read', lambda: self.note.read_posts.add(1), 1),
+        ]
+        for seconds, (name, change, count) in enumerate(changes, start=2):
+            with self.subTest(change=name), self.later(seconds):
+                self.assertEqual(
+                    status.HTTP_304_NOT_MODIFIED,
+                    self.client.get('/feed/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                )
+                change()
+
+                resp = self.client.get('/feed/', HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(status.HTTP_200_OK, resp.status_code)
+                self.assertEqual(count, resp.data['count'])
+                last_modified = resp['Last-Modified']
+
+    def test_note_views_if_modified_since(self):
+        url = f'/notes/{self.note.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, resp.status_code)
+
+        with self.later(2):
+            self.note.read_posts.add(2)
+
+            resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(1, resp.data['views'])
+
+
+class TestAsyncViews(BlogAPITestCase):
+    """
+    TESTS:
+    1. Асинхронные списки и лента отдают то же, что и синхронные;
+    2. Асинхронный просмотр поста отдаёт то же и отмечает пост прочитанным;
+    3. Ошибки совпадают с синхронными представлениями;
+    4. Представления - корутины, и в цикле событий (AsyncClient) к базе не обращаются синхронно.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        for i in range(12):
+            Note.objects.create(title=f'TEST_title_{i}', note=f'TEST_msg_{i}', user_id=i % 2 + 1)
+        Note.objects.get(pk=2).read_posts.add(1)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def assertSameResponse(self, url):
+        sync = self.client.get(url)
+        # в ссылках пагинации отличается только путь
+        async_ = self.client.get(f'/async{url}')
+
+        self.assertEqual(sync.status_code, async_.status_code, url)
+        self.assertEqual(sync['Content-Type'], async_['Content-Type'], url)
+        self.assertEqual(
+            sync.content.decode().replace('/notes/', '/async/notes/').replace('/feed/', '/async/feed/'),
+            async_.content.decode(),
+            url,
+        )
+        return async_
+
+    def test_lists(self):
+        for url in [
+            '/notes/', '/notes/?page=2', '/notes/?pagination=cursor', '/notes/?fields=id,title',
+            '/notes/?excerpt=4&date_format=iso', '/feed/', '/feed/?unread=true', '/feed/?read_posts=1',
+        ]:
+            with self.subTest(url=url):
+                self.assertSameResponse(url)
+
+    def test_detail(self):
+        resp = self.assertSameResponse('/notes/3/')
+
+        self.assertTrue(resp.json()['is_read'])
+        self.assertEqual({'title': 'TEST_title_2'}, self.assertSameResponse('/notes/3/?fields=title').json())
+        read_buffer.flush()
+        self.assertTrue(Note.read_posts.through.objects.filter(note_id=3, profile_id=1).exists())
+
+    @override_settings(READ_RECEIPTS_FLUSH_INTERVAL=0)
+    def test_detail_views(self):
+        self.client.get('/async/notes/3/')
+
+        self.assertEqual(1, Note.objects.get(pk=3).views)
+
+    def test_errors(self):
+        for url in ['/notes/100/', '/notes/?fields=password', '/feed/?unread=maybe', '/notes/?excerpt=0']:
+            with self.subTest(url=url):
+                self.assertSameResponse(url)
+
+        self.client.logout()
+        for url in ['/notes/', '/feed/', '/notes/1/']:
+            with self.subTest(url=url):
+                self.assertEqual(status.HTTP_403_FORBIDDEN, self.assertSameResponse(url).status_code)
+
+    async def test_event_loop(self):
+        for view in (AsyncNoteListView, AsyncFeedView, AsyncNoteDetailView):
+            self.assertTrue(iscoroutinefunction(view.as_view()))
+
+        # автор с подтягиванием: лента собирается из нескольких запросов
+        await Profile.objects.filter(pk=2).aupdate(is_pull_author=True)
+        user = await User.objects.aget(username='test_1')
+        headers = {'Authorization': f'Bearer {await sync_to_async(make_token)(user)}'}
+
+        for url in [
+            '/notes/', '/notes/?page=2', '/notes/?pagination=cursor', '/feed/', '/feed/?pagination=cursor',
+            '/feed/?page=2', '/feed/?read_posts=1', '/notes/3/', '/notes/100/', '/notes/?page=9',
+        ]:
+            with self.subTest(url=url):
+                # синхронный запрос к базе здесь вызвал бы SynchronousOnlyOperation (ответ 500)
+                async_ = await self.async_client.get(f'/async{url}', headers=headers)
+                sync = await sync_to_async(self.client.get)(url, headers=headers)
+
+                self.assertEqual(sync.status_code, async_.status_code)
+                self.assertEqual(
+                    sync.content.decode().replace('/notes/', '/async/notes/').replace('/feed/', '/async/feed/'),
+                    async_.content.decode(),
+                )
+
+
+class TestTokenAuthentication(BlogAPITestCase):
+    """
+    TESTS:
+    1. Выдача токена по имени и паролю;
+    2. Запрос с токеном не читает сессию, пользователя и профиль из базы;
+    3. Отзыв токенов;
+    4. Неверный, просроченный токен и неактивный пользователь;
+    5. Смена пароля отзывает токены, другие изменения пользователя - нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_1', password='1234567')
+        User.objects.create_user(username='test_2', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+        Note.objects.create(title='TEST_title', note='TEST_msg', user_id=2)
+
+    def get_token(self, username='test_1', password='1234567'):
+        resp = self.client.post('/accounts/token/', {'username': username, 'password': password})
+        return resp
+
+    def test_obtain(self):
+        resp = self.get_token()
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertIn('token', resp.data)
+
+        resp = self.get_token(password='wrong')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+
+    def test_no_auth_queries(self):
+        token = self.get_token().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get('/feed/')
+
+        for url in ['/feed/', '/notes/1/', '/notes/']:
+            with self.subTest(url=url):
+                # ?date_format отключает кеш ответов: запросы за данными остаются, за пользователем - нет
+                with CaptureQueriesContext(connection) as ctx:
+                    resp = self.client.get(f'{url}?date_format=iso')
+
+                self.assertEqual(status.HTTP_200_OK, resp.status_code)
+                sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+                self.assertNotIn('"django_session"', sql)
+                self.assertNotIn('FROM "auth_user"', sql)
+                self.assertNotIn('FROM "blog_api_profile" WHERE', sql)
+
+    def test_create_note(self):
+        token = self.get_token().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        resp = self.client.post('/notes/', {'title': 'TEST_title_2', 'note': 'TEST_msg_2'})
+
+        self.assertEqual(status.HTTP_201_CREATED, resp.status_code)
+        self.assertEqual('test_1', resp.data['user'])
+
+    def test_revoke(self):
+        token = self.get_token().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(status.HTTP_200_OK, self.client.get('/notes/').status_code)
+
+        resp = self.client.post('/accounts/token/revoke/')
+        self.assertEqual(status.HTTP_204_NO_CONTENT, resp.status_code)
+
+        resp = self.client.get('/notes/')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertEqual('Token has been revoked.', resp.data['detail'])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_token().data["token"]}')
+        self.assertEqual(status.HTTP_200_OK, self.client.get('/notes/').status_code)
+
+    def test_password_change(self):
+        token = self.get_token().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(status.HTTP_200_OK, self.client.get('/notes/').status_code)
+
+        user = User.objects.get(username='test_1')
+        user.first_name = 'test'
+        user.save()
+        self.assertEqual(status.HTTP_200_OK, self.client.get('/notes/').status_code)
+
+        user.set_password('7654321')
+        user.save()
+        resp = self.client.get('/notes/')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertEqual('Token has been revoked.', resp.data['detail'])
+
+        token = self.get_token(password='7654321').data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(status.HTTP_200_OK, self.client.get('/notes/').status_code)
+
+    def test_invalid(self):
+        # первой в настройках идёт SessionAuthentication, поэтому DRF отвечает 403, а не 401
+        token = self.get_token().data['token']
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get('/notes/').status_code)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with override_settings(BLOG_TOKEN_MAX_AGE=-1):
+            self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get('/notes/').status_code)
+
+        User.objects.filter(pk=1).update(is_active=False)
+        User.objects.get(pk=1).save()
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get('/notes/').status_code)
+
+
+class TestRegistrationQueries(BlogAPITestCase):
+    """
+    TESTS:
+    1. Регистрация - одна транзакция без повторных сохранений профиля;
+    2. Профиль нового пользователя подписан на себя, счётчики верны;
+    3. Массовый импорт пользователей командой.
+    """
+
+    def test_signup_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/accounts/signup/', {'username': 'test_user', 'password': '1234567'})
+
+        self.assertEqual(status.HTTP_201_CREATED, resp.status_code)
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(3, len(writes))
+
+        profile = Profile.objects.get(user__username='test_user')
+        self.assertEqual([profile.pk], list(profile.follows.values_list('id', flat=True)))
+        self.assertEqual((0, 1, 1), (profile.notes_count, profile.follows_count, profile.followers_count))
+
+    def test_import_users(self):
+        User.objects.create_user(username='test_1', password='1234567')
+        data = StringIO(
+            'username,password,email\n'
+            'test_1,1234567,\n'
+            'test_2,1234567,test_2@example.com\n'
+            'test_3,,\n'
+            'test_4,7654321,\n'
+            'test_4,7654321,\n'
+        )
+
+        out = StringIO()
+        call_command('import_users', '-', batch_size=2, iterations=1000, stdin=data, stdout=out)
+
+        self.assertIn('Imported 3 users, skipped 2', out.getvalue())
+        self.assertEqual('test_2@example.com', User.objects.get(username='test_2').email)
+        self.assertFalse(User.objects.get(username='test_3').has_usable_password())
+        self.assertTrue(self.client.login(username='test_4', password='7654321'))
+        # дешёвый хеш обновляется до стандартной стоимости при входе
+        self.assertNotIn('$1000$', User.objects.get(username='test_4').password)
+
+        for profile in Profile.objects.filter(user__username__in=['test_2', 'test_3', 'test_4']):
+            self.assertEqual([profile.pk], list(profile.follows.values_list('id', flat=True)))
+            self.assertEqual((1, 1), (profile.follows_count, profile.followers_count))
+
+
+class TestSeedBlog(BlogAPITestCase):
+    """
+    TESTS:
+    1. Команда создаёт пользователей, подписки, посты и прочтения, счётчики и ленты согласованы;
+    2. Один и тот же seed даёт одинаковые данные, включая время создания постов;
+    3. Повторный запуск с тем же префиксом - ошибка;
+    4. Время создания постов отсчитывается от --until.
+    """
+
+    def seed(self, prefix, seed=0, *args):
+        out = StringIO()
+        call_command(
+            'seed_blog', *args,
+            users=20, follows=4, notes=60, reads=200, seed=seed, prefix=prefix, batch_size=7, stdout=out,
+        )
+        return out.getvalue()
+
+    def snapshot(self, prefix):
+        """ Данные без id: подписки и посты по номерам пользователей """
+        def number(username):
+            return int(username.rsplit('_', 1)[1])
+
+        follows = sorted(
+            (number(a), number(b)) for a, b in Profile.follows.through.objects
+            .filter(from_profile__user__username__startswith=f'{prefix}_')
+            .values_list('from_profile__user__username', 'to_profile__user__username')
+        )
+        notes = sorted(
+            (number(username), title, len(note), create_at) for username, title, note, create_at in Note.objects
+            .filter(user__username__startswith=f'{prefix}_')
+            .values_list('user__username', 'title', 'note', 'create_at')
+        )
+        return follows, notes
+
+    def test_seed(self):
+        self.assertIn('"users": 20', self.seed('a'))
+
+        profiles = Profile.objects.filter(user__username__startswith='a_')
+        self.assertEqual(20, profiles.count())
+        self.assertEqual(60, Note.objects.filter(user__username__startswith='a_').count())
+        self.assertLess(0, Note.read_posts.through.objects.count())
+
+        for profile in profiles:
+            # подписка на себя и счётчики, как после регистрации через API
+            self.assertTrue(profile.follows.filter(pk=profile.pk).exists())
+            self.assertEqual(profile.follows.count(), profile.follows_count)
+            self.assertEqual(profile.followed_by.count(), profile.followers_count)
+            self.assertEqual(Note.objects.filter(user_id=profile.user_id).count(), profile.notes_count)
+            # в ленте - все посты подписок
+            self.assertEqual(
+                set(Note.objects.filter(user__profile__in=profile.follows.all()).values_list('id', flat=True)),
+                set(FeedItem.objects.filter(profile=profile).values_list('note_id', flat=True)),
+            )
+        for note in Note.objects.filter(user__username__startswith='a_'):
+            self.assertEqual(note.read_posts.count(), note.views)
+            self.assertEqual(note.create_at, note.updated_at)
+            self.assertEqual({note.create_at}, set(note.feed_items.values_list('create_at', flat=True)))
+
+        # время создания распределено, а не одно на все посты
+        self.assertLess(1, Note.objects.dates('create_at', 'day').count())
+
+    def test_reproducible(self):
+        self.seed('a', seed=1)
+        self.seed('b', seed=1)
+        self.seed('c', seed=2)
+
+        self.assertEqual(self.snapshot('a'), self.snapshot('b'))
+        self.assertNotEqual(self.snapshot('a'), self.snapshot('c'))
+
+    def test_existing_prefix(self):
+        self.seed('a')
+
+        with self.assertRaises(CommandError):
+            self.seed('a')
+
+    def test_until(self):
+        self.seed('a', 0, '--until=2020-06-01T12:00', '--days=10')
+
+        create_at = Note.objects.filter(user__username__startswith='a_').values_list('create_at', flat=True)
+        self.assertLessEqual(max(create_at), datetime(2020, 6, 1, 12, tzinfo=timezone.utc))
+        self.assertGreaterEqual(min(create_at), datetime(2020, 5, 22, 12, tzinfo=timezone.utc))
+
+        with self.assertRaises(CommandError):
+            self.seed('b', 0, '--until=yesterday')
+
+
+class TestNoteSearch(BlogAPITestCase):
+    """
+    TESTS:
+    1. Поиск по заголовку и тексту: совпадение в заголовке выше, все слова запроса обязательны;
+    2. ?scope=feed - только посты ленты;
+    3. Изменённые и созданные пакетом посты находятся по новому тексту;
+    4. Постраничный вывод и ?fields;
+    5. Некорректные параметры.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(1, 4):
+            User.objects.create_user(username=f'test_{i}', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+
+        Note.objects.create(title='Python tips', note='about django orm', user_id=2)
+        Note.objects.create(title='Django news', note='release notes', user_id=3)
+        Note.objects.create(title='Cooking', note='soup recipe', user_id=2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def search(self, query):
+        resp = self.client.get(f'/notes/search/?{query}')
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        return [note['id'] for note in resp.data['results']]
+
+    def test_search(self):
+        self.assertEqual([2, 1], self.search('q=django'))
+        self.assertEqual([1], self.search('q=django orm'))
+        self.assertEqual([3], self.search('q=soup'))
+        self.assertEqual([], self.search('q=nothing'))
+
+    def test_feed_scope(self):
+        self.assertEqual([1], self.search('q=django&scope=feed'))
+        self.assertEqual([2, 1], self.search('q=django&scope=all'))
+
+    def test_updated_notes(self):
+        self.client.login(username='test_2', password='1234567')
+        self.client.patch('/notes/3/', {'title': 'Borscht'})
+        self.client.post(
+            '/notes/bulk/', {'notes': [{'title': 'Borscht again', 'note': 'beet soup'}]}, format='json',
+        )
+
+        self.assertEqual([4, 3], self.search('q=borscht'))
+
+    def test_pagination(self):
+        for i in range(12):
+            Note.objects.create(title=f'Django {i}', note='text', user_id=3)
+
+        resp = self.client.get('/notes/search/?q=django&fields=id,title')
+
+        self.assertEqual(14, resp.data['count'])
+        self.assertEqual(10, len(resp.data['results']))
+        self.assertEqual({'id', 'title'}, set(resp.data['results'][0]))
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_invalid(self):
+        for query in ['', 'q=', 'q=django&scope=everything']:
+            with self.subTest(query=query):
+                resp = self.client.get(f'/notes/search/?{query}')
+
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+
+
+class TestNoteExport(BlogAPITestCase):
+    """
+    TESTS:
+    1. Выгрузка своих постов в NDJSON с числом просмотров и прочтением;
+    2. Выгрузка ленты в CSV с выбранными полями;
+    3. Число запросов не зависит от числа постов;
+    4. Выгрузка командой;
+    5. Некорректные параметры.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(1, 3):
+            User.objects.create_user(username=f'test_{i}', password='1234567')
+        Profile.objects.get(pk=1).follows.add(2)
+
+        for i in range(3):
+            Note.objects.create(title=f'TEST_title_{i}', note=f'TEST_msg_{i}', user_id=1)
+        Note.objects.create(title='TEST_title_3', note='TEST_msg_3', user_id=2)
+        Note.objects.get(pk=2).read_posts.add(1, 2)
+
+    def setUp(self) -> None:
+        """Перед каждым тестом логиниться"""
+        self.client.login(username='test_1', password='1234567')
+
+    def export(self, query=''):
+        resp = self.client.get(f'/notes/export/{query}')
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        return resp, b''.join(resp.streaming_content).decode()
+
+    def test_ndjson(self):
+        resp, content = self.export('?date_format=iso')
+
+        self.assertEqual('application/x-ndjson; charset=utf-8', resp['Content-Type'])
+        self.assertIn('test_1-notes.ndjson', resp['Content-Disposition'])
+        notes = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([3, 2, 1], [note['id'] for note in notes])
+        self.assertEqual(2, notes[1]['views'])
+        self.assertEqual([False, True, False], [note['is_read'] for note in notes])
+        self.assertEqual('test_1', notes[0]['user'])
+
+    def test_csv(self):
+        resp, content = self.export('?output=csv&scope=feed&fields=id,title,views')
+
+        self.assertEqual('text/csv; charset=utf-8', resp['Content-Type'])
+        self.assertEqual(
+            ['id,title,views', '4,TEST_title_3,0', '3,TEST_title_2,0', '2,TEST_title_1,2', '1,TEST_title_0,0'],
+            content.splitlines(),
+        )
+
+    def test_constant_queries(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.export('?scope=feed')
+            return len(ctx.captured_queries)
+
+        with override_settings(BLOG_EXPORT_CHUNK_SIZE=100):
+            before = count_queries()
+            for i in range(20):
+                Note.objects.create(title=f'TEST_more_{i}', note='TEST_msg', user_id=2)
+
+            self.assertEqual(before, count_queries())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_notes', 'test_1', output_format='csv', fields='id,create_at', chunk_size=2, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(['id', 'create_at'], lines[0].split(','))
+        self.assertEqual(['3', '2', '1'], [line.split(',')[0] for line in lines[1:]])
+        # по умолчанию дата в ISO 8601
+        datetime.fromisoformat(lines[1].split(',')[1].replace('Z', '+00:00'))
+
+        with self.assertRaises(CommandError):
+            call_command('export_notes', 'nobody', stdout=out)
+
+    def test_invalid(self):
+        for query in ['?output=xml', '?scope=all', '?fields=unknown']:
+            with self.subTest(query=query):
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.get(f'/notes/export/{query}').status_code)
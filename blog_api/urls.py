@@ -1,15 +1,30 @@
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # path('accounts/profile/', views.AccountAPIView.as_view()),
     path('accounts/profiles/', views.AccountsAPIView.as_view()),
     path('accounts/profiles/<int:pk>/', views.AccountDetailAPIView.as_view()),
     path('accounts/profiles/<int:pk>/follows/', views.AccountFollowsAPIView.as_view()),
+    path('accounts/profiles/<int:pk>/following/', views.AccountFollowingAPIView.as_view()),
+    path('accounts/profiles/<int:pk>/followers/', views.AccountFollowersAPIView.as_view()),
+    path('accounts/profiles/<int:pk>/follow/', views.AccountFollowAPIView.as_view()),
     path('accounts/signup/', views.CreateUserView.as_view()),
+    path('accounts/token/', views.TokenObtainAPIView.as_view()),
+    path('accounts/token/revoke/', views.TokenRevokeAPIView.as_view()),
     path('notes/', views.NoteAPIView.as_view()),
+    path('notes/bulk/', views.NoteBulkCreateAPIView.as_view()),
+    path('notes/read/', views.NoteBulkReadAPIView.as_view()),
+    path('notes/search/', views.NoteSearchAPIView.as_view()),
+    path('notes/export/', views.NoteExportAPIView.as_view()),
     path('notes/<int:pk>/', views.NoteDetailAPIView.as_view()),
+    path('notes/<int:pk>/readers/', views.NoteReadersAPIView.as_view()),
     path('feed/', views.FeedAPIView.as_view()),
-    path('feed/<int:pk>/', views.NoteDetailAPIView.as_view())
+    path('feed/<int:pk>/', views.NoteDetailAPIView.as_view()),
+    path('cache/stats/', views.CacheStatsAPIView.as_view()),
+    # асинхронные версии адресов чтения для ASGI
+    path('async/notes/', async_views.AsyncNoteListView.as_view()),
+    path('async/notes/<int:pk>/', async_views.AsyncNoteDetailView.as_view()),
+    path('async/feed/', async_views.AsyncFeedView.as_view()),
 ]
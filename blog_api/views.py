@@ -1,61 +1,227 @@
-from django.db.models import Count
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions as rest_permissions
-from rest_framework.generics import ListAPIView, CreateAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
+from rest_framework import permissions as rest_permissions, status
+from rest_framework.generics import get_object_or_404, ListAPIView, CreateAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
     RetrieveAPIView, RetrieveUpdateAPIView, UpdateAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from . import serializers, permissions
+from . import serializers, permissions, feed, reads, cache, counters, authentication, search, export
+from .filters import FeedFilter
+from .pagination import NotePagination, ProfileCursorPagination
 from blog_api.models import Profile, Note
 
 
-class FeedAPIView(ListAPIView):
+class ConditionalGetMixin:
+    """
+    Условный GET: ETag и Last-Modified считаются по версиям из кеша и датам постов,
+    на If-None-Match / If-Modified-Since отвечаем 304 до чтения данных и сериализации
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        """ Возвращает (etag, last_modified) - части ETag и datetime, или None вместо любого из них """
+        raise NotImplementedError
+
+    def not_modified(self, request, *args, **kwargs):
+        """ Побочные действия полного ответа, которые нужны и при 304 """
+
+    def get(self, request, *args, **kwargs):
+        etag_parts, last_modified = self.get_validators(request, *args, **kwargs)
+
+        etag = None
+        if etag_parts is not None:
+            # в ответе участвуют параметры запроса и формат (JSON или browsable API)
+            parts = [*etag_parts, request.get_full_path(), request.accepted_media_type]
+            etag = quote_etag(md5('|'.join(map(str, parts)).encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        elif response.status_code == status.HTTP_304_NOT_MODIFIED:
+            self.not_modified(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            if etag is not None:
+                response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class RequestedFieldsMixin:
+    """ Поля ответа с учётом ?fields / ?exclude: по ним get_queryset убирает лишние join'ы и аннотации """
+
+    def get_requested_fields(self):
+        return self.get_serializer_class().get_requested_fields(self.request)
+
+
+class NoteValuesListMixin(RequestedFieldsMixin):
+    """ Список постов строится из .values() без ModelSerializer (см. serializers.NoteValuesSerializer) """
+
+    def with_requested_fields(self, queryset):
+        fields = self.get_requested_fields()
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        if 'is_read' in fields:
+            queryset = queryset.annotate(is_read=reads.is_read_by(self.request.user.profile.pk))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = serializers.NoteValuesSerializer(context=self.get_serializer_context())
+
+        page = self.paginate_queryset(serializer.get_values(queryset))
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+
+        return Response(serializer.to_representation(serializer.get_values(queryset)))
+
+
+class FeedAPIView(ConditionalGetMixin, NoteValuesListMixin, ListAPIView):
     """ Представление для просмотра ленты постов из подписок """
     permission_classes = [IsAuthenticated]
     queryset = Note.objects.all()
     serializer_class = serializers.NoteSerializer
+    pagination_class = NotePagination
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['read_posts']
+    filterset_class = FeedFilter
+    # ключ страниц - столбцы FeedItem (см. feed.feed_queryset)
+    keyset_fields = feed.FEED_KEYSET_FIELDS
+
+    def list(self, request, *args, **kwargs):
+        """ Страница ленты кешируется как список id постов, сами посты - в кеше постов """
+        if not cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+
+        key = cache.feed_page_key(request.user.profile.pk, request.get_full_path())
+        page = cache.get_feed_page(key)
+
+        if page is None:
+            response = super().list(request, *args, **kwargs)
+            results = response.data['results']
+            cache.set_objects(cache.NOTE, {item['id']: item for item in results})
+            cache.set_feed_page(key, {
+                'envelope': {name: value for name, value in response.data.items() if name != 'results'},
+                'ids': [item['id'] for item in results],
+                # лента сбрасывается при прочтении, поэтому отметки можно хранить вместе со страницей
+                'read_ids': [item['id'] for item in results if item['is_read']],
+            })
+            return response
+
+        read_ids = set(page['read_ids'])
+        results = [
+            {**note, 'is_read': note['id'] in read_ids}
+            for note in self.get_cached_notes(page['ids'])
+        ]
+        return Response({**page['envelope'], 'results': results})
+
+    def filter_queryset(self, queryset):
+        if isinstance(queryset, feed.MergedQuerySet):
+            return queryset.map(super().filter_queryset)
+        return super().filter_queryset(queryset)
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        Версия ленты и время её смены меняются при публикации в подписках, подписке, отписке и прочтении.
+        Посты авторов с подтягиванием меняют только время самого свежего поста. Правки постов и число
+        просмотров ленту не сбрасывают, поэтому ETag и Last-Modified, как и страницы в кеше,
+        живут не дольше BLOG_CACHE_FEED_TIMEOUT: начало периода тоже входит в Last-Modified
+        """
+        profile = request.user.profile
+        newest = feed.newest_create_at(profile)
+        period = int(time.time() // settings.BLOG_CACHE_FEED_TIMEOUT)
+        period_start = datetime.fromtimestamp(period * settings.BLOG_CACHE_FEED_TIMEOUT, tz=timezone.utc)
+        last_modified = max(filter(None, (cache.feed_modified(profile.pk), newest, period_start)))
+
+        return (cache.feed_version(profile.pk), newest, period), last_modified
+
+    def get_cached_notes(self, ids):
+        notes = cache.get_objects(cache.NOTE, ids)
+        missing = [pk for pk in ids if pk not in notes]
+
+        if missing:
+            # is_read берётся из страницы ленты, здесь он не нужен
+            fields = [name for name in serializers.NoteSerializer.Meta.fields if name not in cache.USER_FIELDS]
+            serializer = serializers.NoteValuesSerializer(context=self.get_serializer_context(), fields=fields)
+            rows = serializer.get_values(Note.objects.filter(id__in=missing))
+            loaded = {item['id']: item for item in serializer.to_representation(rows)}
+            cache.set_objects(cache.NOTE, loaded)
+            notes.update(loaded)
+
+        # удалённые посты просто пропускаем
+        return [notes[pk] for pk in ids if pk in notes]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        follows = [i for i in user.profile.follows.all()]
+        # Лента собирается заранее при публикации поста (см. blog_api.feed)
+        queryset = feed.feed_queryset(self.request.user.profile)
 
-        return queryset\
-            .filter(user__username__in=follows)\
-            .order_by('-create_at') \
-            .select_related('user') \
-            .prefetch_related('read_posts',)
-            # .exclude(read_posts=user.profile)   # можно исключить прочитанные посты из ленты, но тогда отваливаются фильтры
+        return self.with_requested_fields(queryset)
 
 
-class AccountsAPIView(ListAPIView):
+class AccountsAPIView(RequestedFieldsMixin, ListAPIView):
     """ Представление для просмотра профилей """
     permission_classes = [IsAuthenticated]
     # сортировка по количеству постов в порядке убывания
-    queryset = Profile.objects.all().annotate(cnt=Count('user__note')).order_by('-cnt')
+    queryset = Profile.objects.order_by('-notes_count', 'id')
     serializer_class = serializers.AccountSerializer
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        return queryset.select_related('user').prefetch_related('user__note', 'follows')
+        if 'user' in self.get_requested_fields():
+            queryset = queryset.select_related('user')
+        return queryset
 
 
-class AccountDetailAPIView(RetrieveUpdateAPIView):
+class AccountDetailAPIView(ConditionalGetMixin, RequestedFieldsMixin, RetrieveUpdateAPIView):
     """ Представление для просмотра отдельного профиля """
     permission_classes = [IsAuthenticated, permissions.OnlyAuthor]
     queryset = Profile.objects.all()
     serializer_class = serializers.AccountDetailSerializer
+    # поля ответа, которые берутся из пользователя
+    user_fields = {'user', 'first_name', 'last_name', 'email'}
+
+    def get_validators(self, request, *args, **kwargs):
+        # версия профиля меняется вместе со сбросом его кеша
+        return (cache.object_version(cache.PROFILE, kwargs['pk']),), None
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cache.is_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        data = cache.get_object(cache.PROFILE, kwargs['pk'])
+        if data is not None:
+            return Response(data)
+
+        response = super().retrieve(request, *args, **kwargs)
+        cache.set_object(cache.PROFILE, kwargs['pk'], response.data)
+        return response
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        fields = self.get_requested_fields()
 
-        return queryset \
-            .select_related('user')\
-            .prefetch_related('user__note', 'follows')
+        if self.user_fields.intersection(fields):
+            queryset = queryset.select_related('user')
+        if 'follows' in fields:
+            queryset = queryset.prefetch_related('follows')
+        return queryset
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # счётчики обновляются сигналами в базе, поэтому перечитываем профиль после изменения подписок
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
 
 
 # class AccountAPIView(ListAPIView):
@@ -73,7 +239,7 @@ class AccountDetailAPIView(RetrieveUpdateAPIView):
 #             .prefetch_related('user__note', 'follows')
 
 
-class AccountFollowsAPIView(RetrieveAPIView):
+class AccountFollowsAPIView(RequestedFieldsMixin, RetrieveAPIView):
     """ Представление для просмотра подписок пользователя """
     permission_classes = [IsAuthenticated]
     queryset = Profile.objects.all()
@@ -81,10 +247,72 @@ class AccountFollowsAPIView(RetrieveAPIView):
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        if 'follows' in fields:
+            queryset = queryset.prefetch_related('follows__user')
+        return queryset
+
+
+class AccountFollowingAPIView(ListAPIView):
+    """ Постраничный список подписок профиля """
+    permission_classes = [IsAuthenticated]
+    serializer_class = serializers.AccountUsernameSerializer
+    pagination_class = ProfileCursorPagination
+    # связь, по которой профили списка связаны с профилем из адреса
+    lookup_relation = 'followed_by'
+
+    def get_queryset(self):
+        profile = get_object_or_404(Profile.objects.only('id'), pk=self.kwargs['pk'])
 
-        return queryset \
+        return Profile.objects \
+            .filter(**{self.lookup_relation: profile}) \
             .select_related('user') \
-            .prefetch_related('follows__user')
+            .only('id', 'user__username')
+
+
+class AccountFollowersAPIView(AccountFollowingAPIView):
+    """ Постраничный список подписчиков профиля """
+    lookup_relation = 'follows'
+
+
+class AccountFollowAPIView(APIView):
+    """
+    Подписка на профиль (POST) и отписка (DELETE).
+    Меняется одна строка связи, а не весь список follows, как при PUT/PATCH профиля
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        author = get_object_or_404(Profile.objects.only('id'), pk=pk)
+        profile = self.get_profile(request)
+
+        with transaction.atomic():
+            if profile.follows.filter(pk=author.pk).exists():
+                return Response({'follows': author.pk}, status=status.HTTP_200_OK)
+            # add сам пропускает существующие строки и отправляет m2m_changed:
+            # сигналы дополняют ленту, обновляют счётчики и кеш
+            profile.follows.add(author)
+
+        return Response({'follows': author.pk}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk):
+        author = get_object_or_404(Profile.objects.only('id'), pk=pk)
+        profile = self.get_profile(request)
+
+        with transaction.atomic():
+            # повторная отписка ничего не пишет и не пересчитывает
+            if profile.follows.filter(pk=author.pk).exists():
+                profile.follows.remove(author)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def get_profile(request):
+        # при входе по токену профиль уже загружен из кеша
+        return request.user.profile
 
 
 class CreateUserView(CreateAPIView):
@@ -96,38 +324,245 @@ class CreateUserView(CreateAPIView):
     serializer_class = serializers.UserSignUpSerializer
 
 
-class NoteAPIView(ListCreateAPIView):
+class TokenObtainAPIView(APIView):
+    """ Выдача подписанного токена доступа по имени и паролю """
+    # прежний (например, отозванный) токен в заголовке не мешает получить новый
+    authentication_classes = []
+    permission_classes = [rest_permissions.AllowAny]
+
+    def post(self, request):
+        serializer = serializers.TokenObtainSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        return Response({'token': authentication.make_token(serializer.validated_data['user'])})
+
+
+class TokenRevokeAPIView(APIView):
+    """ Отзыв всех токенов текущего пользователя """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        authentication.revoke_tokens(request.user.pk)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class NoteAPIView(NoteValuesListMixin, ListCreateAPIView):
     """ Создание и просмотр постов """
     permission_classes = [IsAuthenticated]
-    queryset = Note.objects.all().order_by('-create_at')
+    queryset = Note.objects.all().order_by('-create_at', '-id')
     serializer_class = serializers.NoteSerializer
+    pagination_class = NotePagination
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # пост, счётчик автора и ленты подписчиков (сигналы post_save) сохраняются вместе или никак
+        with transaction.atomic():
+            note = serializer.save(user=self.request.user)
+        note.is_read = False
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        return queryset \
-            .select_related('user')\
-            .prefetch_related('read_posts')
+        return self.with_requested_fields(queryset)
+
+
+class NoteSearchAPIView(NoteValuesListMixin, ListAPIView):
+    """ Поиск по заголовку и тексту постов, ?scope=feed - только в ленте. Сначала наиболее подходящие """
+    permission_classes = [IsAuthenticated]
+    queryset = Note.objects.all()
+    serializer_class = serializers.NoteSerializer
+
+    def get_queryset(self):
+        params = serializers.NoteSearchSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+
+        if params.validated_data['scope'] == 'feed':
+            queryset = feed.feed_notes(self.request.user.profile)
+        else:
+            queryset = super().get_queryset()
+        queryset = search.search(queryset, params.validated_data['q'])
+
+        return self.with_requested_fields(queryset)
+
+
+class NoteExportAPIView(APIView):
+    """
+    Потоковая выгрузка всех своих постов (?scope=feed - ленты) в NDJSON или CSV (?output=csv)
+    без постраничного вывода: посты читаются из курсора пачками и сразу отдаются клиенту
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = serializers.NoteExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output, scope = params.validated_data['output'], params.validated_data['scope']
+
+        # ?fields, ?exclude и ?date_format проверяются до начала ответа
+        serializer = serializers.NoteValuesSerializer(context={'request': request, 'view': self})
+        queryset = export.export_queryset(request.user.profile, scope, serializer.fields)
 
+        response = StreamingHttpResponse(
+            export.export_lines(output, serializer, queryset, settings.BLOG_EXPORT_CHUNK_SIZE),
+            content_type=export.FORMATS[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{request.user.username}-{scope}.{output}"'
+        return response
 
-class NoteDetailAPIView(RetrieveUpdateDestroyAPIView):
+
+class NoteDetailAPIView(ConditionalGetMixin, RequestedFieldsMixin, RetrieveUpdateDestroyAPIView):
     """ Редактирование и удаление поста """
     permission_classes = [IsAuthenticated, permissions.OnlyAuthor]
     queryset = Note.objects.all()
     serializer_class = serializers.NoteSerializer
+    # столбцы поста, которые отдаются в ответе как есть
+    note_columns = {'title', 'note', 'create_at', 'views'}
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        if self.request.method in rest_permissions.SAFE_METHODS:
+            # при чтении не загружаем столбцы, не попавшие в ответ
+            queryset = queryset.only('id', 'user', *self.note_columns.intersection(fields))
+        return queryset
+
+    def get_validators(self, request, *args, **kwargs):
+        # is_read в ответе всегда True: открытый пост отмечается прочитанным
+        state = Note.objects.filter(pk=kwargs['pk']).values_list('updated_at', 'views').first()
+        if state is None:
+            return None, None
+
+        updated_at, views = state
+        # число просмотров меняется без updated_at, но вместе со сбросом кеша поста
+        return (kwargs['pk'], updated_at, views), max(updated_at, cache.object_modified(cache.NOTE, kwargs['pk']))
+
+    def not_modified(self, request, *args, **kwargs):
+        # пост открыт повторно из кеша клиента, но всё равно прочитан
+        reads.record_read(Note(pk=kwargs['pk']), request.user.profile.pk)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cache.is_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        # при немедленной записи прочтения число просмотров меняется, поэтому кеш не используем
+        data = cache.get_object(cache.NOTE, kwargs['pk']) if reads.is_buffered() else None
+        if data is not None:
+            reads.record_read(Note(pk=kwargs['pk']), request.user.profile.pk)
+            return Response({**data, 'is_read': True})
 
-        return queryset \
-            .select_related('user')
+        response = super().retrieve(request, *args, **kwargs)
+        cache.set_object(cache.NOTE, kwargs['pk'], response.data)
+        return response
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        # вместе с постом удаляются строки лент и прочтений, уменьшается счётчик автора
+        with transaction.atomic():
+            super().perform_destroy(instance)
 
     def get_object(self):
         """ При открытии поста он автоматически становится прочитанным пользователем """
         obj = super().get_object()
         user = self.request.user
-        obj.read_posts.add(user.profile)
+        # запись прочтения буферизуется и сохраняется пачкой (см. blog_api.reads)
+        reads.record_read(obj, user.profile.pk)
+        obj.is_read = True
         return obj
+
+
+class NoteReadersAPIView(ListAPIView):
+    """ Постраничный список прочитавших пост """
+    permission_classes = [IsAuthenticated]
+    serializer_class = serializers.AccountUsernameSerializer
+    pagination_class = ProfileCursorPagination
+
+    def get_queryset(self):
+        note = get_object_or_404(Note.objects.only('id'), pk=self.kwargs['pk'])
+
+        return Profile.objects \
+            .filter(note=note) \
+            .select_related('user') \
+            .only('id', 'user__username')
+
+
+class NoteBulkCreateAPIView(APIView):
+    """ Пакетное создание постов одной транзакцией """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        batch = serializers.BulkNoteSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        results = []
+        notes = []
+        for index, item in enumerate(batch.validated_data['notes']):
+            serializer = serializers.NoteSerializer(data=item)
+            if serializer.is_valid():
+                notes.append(Note(user=request.user, **serializer.validated_data))
+                results.append({'index': index, 'status': status.HTTP_201_CREATED})
+            else:
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+
+        if notes:
+            profile = request.user.profile
+            # bulk_create не отправляет post_save: ленты, счётчики и поисковый вектор обновляем сами
+            with transaction.atomic():
+                notes = Note.objects.bulk_create(notes)
+                follower_ids = feed.fan_out_notes(request.user.id, notes)
+                search.update_vectors(Note.objects.filter(id__in=[note.id for note in notes]))
+                counters.add_profile_counts(Profile.objects.filter(pk=profile.pk), notes_count=len(notes))
+
+            cache.invalidate(cache.PROFILE, [profile.pk])
+            cache.bump_feeds(follower_ids)
+
+        created = iter(notes)
+        context = {'request': request}
+        for result in results:
+            if result['status'] == status.HTTP_201_CREATED:
+                note = next(created)
+                note.is_read = False
+                result['note'] = serializers.NoteSerializer(note, context=context).data
+
+        return Response({'results': results}, status=self.get_status(len(notes), len(results)))
+
+    @staticmethod
+    def get_status(created, total):
+        if created == total:
+            return status.HTTP_201_CREATED
+        if created:
+            return status.HTTP_207_MULTI_STATUS
+        return status.HTTP_400_BAD_REQUEST
+
+
+class NoteBulkReadAPIView(APIView):
+    """ Пакетная отметка постов прочитанными одной транзакцией """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        batch = serializers.BulkReadSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        ids = batch.validated_data['ids']
+        existing = set(Note.objects.filter(id__in=ids).values_list('id', flat=True))
+        if existing:
+            profile_id = request.user.profile.pk
+            reads.write_reads({(note_id, profile_id) for note_id in existing})
+
+        results = [
+            {'id': note_id, 'status': status.HTTP_200_OK if note_id in existing else status.HTTP_404_NOT_FOUND}
+            for note_id in ids
+        ]
+        return Response({'results': results})
+
+
+class CacheStatsAPIView(APIView):
+    """ Статистика попаданий и промахов кеша """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats())
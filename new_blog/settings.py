@@ -95,6 +95,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -139,6 +157,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        'blog_api.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -173,3 +192,34 @@ REST_FRAMEWORK = {
 
 LOGIN_REDIRECT_URL = '/feed/'
 
+# Лента: посты раскладываются по лентам подписчиков при публикации.
+# Авторы с большим числом подписчиков читаются при запросе ленты.
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+# Сколько последних постов автора попадает в ленту при подписке
+FEED_BACKFILL_SIZE = 200
+FEED_BATCH_SIZE = 1000
+
+
+# Прочтения постов копятся в памяти и записываются пачкой раз в N секунд.
+# 0 - записывать сразу при открытии поста.
+READ_RECEIPTS_FLUSH_INTERVAL = 5
+READ_RECEIPTS_MAX_BUFFER = 1000
+
+# Кеш сериализованных постов, профилей и страниц ленты
+BLOG_CACHE_ALIAS = 'default'
+BLOG_CACHE_TIMEOUT = 300
+BLOG_CACHE_FEED_TIMEOUT = 30
+
+# Максимальное число элементов в пакетных запросах /notes/bulk/ и /notes/read/
+BULK_MAX_BATCH_SIZE = 100
+
+# Сколько постов читается из курсора базы за раз при выгрузке /notes/export/
+BLOG_EXPORT_CHUNK_SIZE = 2000
+
+# Подписанные токены доступа: срок действия и время жизни пользователя токена в кеше, секунды
+BLOG_TOKEN_MAX_AGE = 7 * 24 * 60 * 60
+BLOG_TOKEN_CACHE_TIMEOUT = 60
+
+# Конфигурация полнотекстового поиска PostgreSQL: 'simple' без стемминга подходит для постов на любом языке.
+# После изменения пересчитать индекс командой rebuild_search_index
+BLOG_SEARCH_CONFIG = 'simple'